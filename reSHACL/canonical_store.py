@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from rdflib import Graph
+from rdflib.namespace import OWL
+from rdflib.store import Store
+from rdflib.term import Node
+
+Triple = Tuple[Node, Node, Node]
+
+
+class CanonicalStore(Store):
+    """
+    Read-time owl:sameAs merging over another graph.
+
+    merge() records that some nodes are the same as a canonical node;
+    nothing is copied or moved. Reads rewrite subjects and objects to their
+    canonical node (the merged members themselves no longer appear) and
+    drop the owl:sameAs loops this creates, so the view looks like the
+    graph with the members' triples moved onto their canonical node. Writes
+    go to the base graph with canonical terms; add_verbatim() stores a
+    triple as is, e.g. the final `rep owl:sameAs member` links.
+    """
+
+    # pyshacl wraps the data graph's store in a Dataset, which needs these;
+    # the view itself has a single context (`context`) and ignores the one
+    # asked for
+    context_aware = True
+    formula_aware = False
+    transaction_aware = False
+    graph_aware = True
+
+    def __init__(self, base: Graph):
+        super().__init__()
+        self.base = base
+        self.verbatim = Graph()
+        self.canon: Dict[Node, Node] = {}
+        self.members: Dict[Node, List[Node]] = {}  # rep -> [rep, merged members...]
+        # (len(base), len(verbatim), count) of the last full count; merges
+        # and writes through the view drop it
+        self._len: Optional[Tuple[int, int, int]] = None
+        # every triple is reported in this context: pyshacl finds the graph
+        # of a blank node through Dataset.quads() to print its description
+        self.context = Graph(store=self, identifier=base.identifier)
+
+    # ----------------------------
+    # Merging
+    # ----------------------------
+    def merge(self, canon: Dict[Node, Node]) -> None:
+        """
+        canon: { node -> representative } for the nodes to merge; both are
+        taken as seen through this view (a representative may itself be
+        merged into another one later).
+        """
+        self._len = None
+        for x, rep in canon.items():
+            if x == rep:
+                continue
+            group = self.members.setdefault(rep, [rep])
+            for m in self.members.pop(x, [x]):
+                self.canon[m] = rep
+                group.append(m)
+
+    def find(self, x: Node) -> Node:
+        return self.canon.get(x, x)
+
+    def _expand(self, term: Optional[Node]) -> Iterable[Optional[Node]]:
+        if term is None:
+            return (None,)
+        if term in self.canon:
+            return ()  # merged away
+        return self.members.get(term) or (term,)
+
+    # ----------------------------
+    # Store API
+    # ----------------------------
+    def triples(self, triple_pattern, context=None) -> Iterator[Tuple[Triple, Iterator]]:
+        s, p, o = triple_pattern
+        canon, members = self.canon, self.members
+        contexts = (self.context,)
+        # a canonical triple can come from several base triples only if it
+        # involves a merged group
+        seen: Set[Triple] = set()
+        for ss in self._expand(s):
+            for oo in self._expand(o):
+                for bs, bp, bo in self.base.triples((ss, p, oo)):
+                    cs, co = canon.get(bs, bs), canon.get(bo, bo)
+                    if cs in members or co in members:
+                        if bp == OWL.sameAs and cs == co:
+                            continue
+                        t = (cs, bp, co)
+                        if t in seen:
+                            continue
+                        seen.add(t)
+                    else:
+                        t = (cs, bp, co)
+                    yield t, iter(contexts)
+        for t in self.verbatim.triples((s, p, o)):
+            if t not in seen and not self._from_base(t):
+                yield t, iter(contexts)
+
+    def _from_base(self, t: Triple) -> bool:
+        s, p, o = t
+        if s in self.canon or o in self.canon:
+            return False
+        if p == OWL.sameAs and s == o and s in self.members:
+            return False
+        for ss in self._expand(s):
+            for oo in self._expand(o):
+                if (ss, p, oo) in self.base:
+                    return True
+        return False
+
+    def __len__(self, context=None) -> int:
+        # pyshacl asks for the length of the data graph for every result
+        sizes = (len(self.base), len(self.verbatim))
+        if self._len is None or self._len[:2] != sizes:
+            self._len = sizes + (sum(1 for _ in self.triples((None, None, None))),)
+        return self._len[2]
+
+    def add(self, triple: Triple, context=None, quoted: bool = False) -> None:
+        s, p, o = triple
+        self._len = None
+        self.base.add((self.find(s), p, self.find(o)))
+
+    def add_verbatim(self, triple: Triple) -> None:
+        self._len = None
+        self.verbatim.add(triple)
+
+    def remove(self, triple_pattern, context=None) -> None:
+        self._len = None
+        for (cs, p, co), _ in list(self.triples(triple_pattern)):
+            for ss in self._expand(cs):
+                for oo in self._expand(co):
+                    self.base.remove((ss, p, oo))
+        self.verbatim.remove(triple_pattern)
+
+    def contexts(self, triple=None):
+        return iter((self.context,))
+
+    def add_graph(self, graph: Graph) -> None:
+        pass
+
+    def remove_graph(self, graph: Graph) -> None:
+        pass
+
+    def bind(self, prefix, namespace, override: bool = True) -> None:
+        self.base.store.bind(prefix, namespace, override=override)
+
+    def prefix(self, namespace):
+        return self.base.store.prefix(namespace)
+
+    def namespace(self, prefix):
+        return self.base.store.namespace(prefix)
+
+    def namespaces(self):
+        return self.base.store.namespaces()
+
+
+def canonical_view(g: Graph) -> Graph:
+    """
+    A Graph over a CanonicalStore wrapping `g`, sharing its prefixes.
+    """
+    return Graph(store=CanonicalStore(g), identifier=g.identifier, namespace_manager=g.namespace_manager)
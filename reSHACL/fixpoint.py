@@ -0,0 +1,346 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from rdflib import Graph
+from rdflib.namespace import OWL, RDF, RDFS
+from rdflib.store import TripleAddedEvent, TripleRemovedEvent
+from rdflib.term import Node
+
+from tc_engine.engine_property import PropertyClosure
+from .canonical_store import CanonicalStore
+
+Triple = Tuple[Node, Node, Node]
+
+# predicates that change which properties a target class watches in target_range
+_HIERARCHY = (RDFS.range, RDFS.subPropertyOf, OWL.equivalentProperty)
+# property types whose merge_same_property rules fire on any new triple
+_PROPERTY_RULES = (
+    OWL.SymmetricProperty, OWL.TransitiveProperty, OWL.FunctionalProperty, OWL.InverseFunctionalProperty,
+)
+
+
+class DeltaLog:
+    """
+    The triples added to a graph while attached, in order. A triple counts
+    only if it was not in the graph yet (the store dispatches
+    TripleAddedEvent before inserting it). Writes to a canonical_view are
+    followed on its base graph; merges on the view add nothing here and are
+    recorded with extend().
+    """
+
+    def __init__(self, g: Graph):
+        self.graph = g.store.base if isinstance(g.store, CanonicalStore) else g
+        self.log: List[Triple] = []
+        self._dispatcher = self.graph.store.dispatcher
+        # rdflib's Memory store: look triples up in its spo index directly,
+        # Graph.__contains__ also resolves their contexts
+        self._spo = getattr(self.graph.store, "_Memory__spo", None)
+        # an IntegerStore answers from its own index
+        self._contains = getattr(self.graph.store, "contains_triple", None)
+        self._own_map = self._dispatcher.get_map() is None
+        self._dispatcher.subscribe(TripleAddedEvent, self._on_add)
+        # once a map is set, events without a handler raise
+        self._dispatcher.get_map().setdefault(TripleRemovedEvent, [])
+
+    def _on_add(self, event) -> None:
+        t = event.triple
+        if self._spo is not None:
+            s, p, o = t
+            if o in self._spo.get(s, {}).get(p, ()):
+                return
+        elif self._contains is not None:
+            if self._contains(t):
+                return
+        elif t in self.graph:
+            return
+        self.log.append(t)
+
+    def __len__(self) -> int:
+        return len(self.log)
+
+    def extend(self, triples: Iterable[Triple]) -> None:
+        self.log.extend(triples)
+
+    def close(self) -> None:
+        if self._own_map:
+            self._dispatcher.set_map(None)
+        else:
+            self._dispatcher.get_map()[TripleAddedEvent].remove(self._on_add)
+
+
+def _class_linked(g: Graph, c: Node) -> bool:
+    # not sameClasses_merged
+    return (
+        next(g.subjects(OWL.equivalentClass, c), None) is not None
+        or next(g.objects(c, OWL.equivalentClass), None) is not None
+        or next(g.subjects(OWL.sameAs, c), None) is not None
+        or next(g.objects(c, OWL.sameAs), None) is not None
+    )
+
+
+def _path_linked(g: Graph, p: Node) -> bool:
+    # p still has sameAs / equivalent / sub-properties left to merge
+    return (
+        next(g.objects(p, OWL.sameAs), None) is not None
+        or next(g.subjects(OWL.sameAs, p), None) is not None
+        or next(g.objects(p, OWL.equivalentProperty), None) is not None
+        or next(g.subjects(OWL.equivalentProperty, p), None) is not None
+        or next(g.subjects(RDFS.subPropertyOf, p), None) is not None
+    )
+
+
+class Worklist:
+    """
+    Semi-naive scheduling of the merged_graph fixpoint loop.
+
+    Every rule keeps a cursor into a DeltaLog of the data graph, set when
+    the rule last started, and on its next run only fires for what the
+    triples added since then can affect:
+
+      - merge_target_classes: target classes still linked by
+        owl:equivalentClass/owl:sameAs (new classes, or classes touched by a new link),
+      - target_range: new target classes and classes whose range properties
+        (with their sub- and equivalent properties) got new triples or grew,
+      - merge_same_property: properties that are the subject, predicate or
+        object of a new triple, whose inverse got new triples, or whose
+        domain/range is a new target class,
+      - merge_same_focus_all: only when there are new owl:sameAs triples or focus nodes,
+      - the sh:node path scan: only when one of those paths got new triples.
+
+    A rule skipped this way would not have changed the graph. The loop
+    condition is kept up to date the same way. `history` has one dict of
+    delta counts per round: triples added, classes merged, range classes
+    and properties re-fired, new focus nodes.
+    """
+
+    def __init__(
+        self,
+        g: Graph,
+        target_classes: Set[Node],
+        path_value: Set[Node],
+        focus_nodes: Set[Node],
+        shape_linked_target: Set[Node],
+        prop_closure: PropertyClosure,
+        merge_classes: bool = False,
+    ):
+        self.g = g
+        self.delta = DeltaLog(g)
+        self.target_classes = target_classes
+        self.path_value = path_value
+        self.focus_nodes = focus_nodes
+        self.shape_linked_target = shape_linked_target
+        self.prop_closure = prop_closure
+        self.merge_classes = merge_classes
+
+        # None: the rule has not run yet, everything is dirty
+        self._cursor: Dict[str, Optional[int]] = {
+            "classes": None, "paths": None, "range": None, "properties": None,
+            "focus": 0, "linked": 0,
+        }
+        self._focus_count = len(focus_nodes)
+        self._class_seen: Set[Node] = set()
+        self._range_seen: Set[Node] = set()
+        self._range_watch: Dict[Node, frozenset] = {}
+        self._property_seen: Set[Node] = set()
+        self._view_merged = len(g.store.canon) if isinstance(g.store, CanonicalStore) else 0
+
+        self.unmerged_classes: List[Node] = []
+        self.unmerged_paths: Set[Node] = set()
+        self.history: List[Dict[str, int]] = []
+        self._round: Optional[Dict[str, int]] = None
+
+    # ----------------------------
+    # Rounds
+    # ----------------------------
+    def _since(self, rule: str) -> Optional[List[Triple]]:
+        start = self._cursor[rule]
+        self._cursor[rule] = len(self.delta)
+        return None if start is None else self.delta.log[start:]
+
+    def _close_round(self) -> None:
+        if self._round is not None:
+            self._round["added"] = len(self.delta) - self._round.pop("_start")
+            self._round["nodes"] = len(self.focus_nodes) - self._round.pop("_nodes")
+            self.history.append(self._round)
+            self._round = None
+
+    def next_round(self) -> bool:
+        """
+        Ends the current round and tells whether another one is needed
+        (some target class or shape path is not merged yet).
+        """
+        self._close_round()
+        g = self.g
+        if self.merge_classes:
+            delta = self._since("classes")
+            if delta is None:
+                candidates = set(self.target_classes)
+            else:
+                candidates = set(self.unmerged_classes)
+                for s, p, o in delta:
+                    if p == OWL.equivalentClass or p == OWL.sameAs:
+                        candidates.add(s)
+                        candidates.add(o)
+                candidates.update(self.target_classes - self._class_seen)
+            self._class_seen = set(self.target_classes)
+            self.unmerged_classes = [
+                c for c in self.target_classes if c in candidates and _class_linked(g, c)
+            ]
+
+        delta = self._since("paths")
+        if delta is None:
+            candidates = set(self.path_value)
+        else:
+            candidates = set(self.unmerged_paths)
+            for s, p, o in delta:
+                if p == OWL.sameAs or p == OWL.equivalentProperty:
+                    candidates.add(s)
+                    candidates.add(o)
+                elif p == RDFS.subPropertyOf:
+                    candidates.add(o)
+        self.unmerged_paths = {p for p in candidates if p in self.path_value and _path_linked(g, p)}
+
+        if not self.unmerged_classes and not self.unmerged_paths:
+            return False
+        self._round = {
+            "_start": len(self.delta), "_nodes": len(self.focus_nodes),
+            "classes": len(self.unmerged_classes), "range_classes": 0, "properties": 0,
+        }
+        return True
+
+    # ----------------------------
+    # Dirty sets
+    # ----------------------------
+    def _watched(self, c: Node) -> frozenset:
+        pc = self.prop_closure
+        watched = set()
+        for pp in self.g.subjects(RDFS.range, c):
+            watched.add(pp)
+            watched.update(pc.equivalents(pp))
+            for subp in pc.sub_properties(pp):
+                watched.update(pc.equivalents(subp))
+        return frozenset(watched)
+
+    def range_classes(self) -> List[Node]:
+        """
+        The target classes target_range has to visit this round, in target_classes order.
+        """
+        delta = self._since("range")
+        objects: Dict[Node, List[Node]] = {}  # predicate -> objects of its new triples
+        if delta is None:
+            dirty = set(self.target_classes)
+            rewatch = True
+        else:
+            dirty = self.target_classes - self._range_seen
+            for _, p, o in delta:
+                objects.setdefault(p, []).append(o)
+            rewatch = any(p in objects for p in _HIERARCHY)
+        g, focus = self.g, self.focus_nodes
+        for c in self.target_classes:
+            if rewatch or c not in self._range_watch:
+                watched = self._watched(c)
+                if watched - self._range_watch.get(c, frozenset()):
+                    dirty.add(c)
+                self._range_watch[c] = watched
+            if c in dirty:
+                continue
+            # a new triple only matters if its object is not typed/targeted yet
+            for p in self._range_watch[c].intersection(objects):
+                if any(o not in focus or (o, RDF.type, c) not in g for o in objects[p]):
+                    dirty.add(c)
+                    break
+        self._range_seen = set(self.target_classes)
+
+        classes = [c for c in self.target_classes if c in dirty]
+        if self._round is not None:
+            self._round["range_classes"] = len(classes)
+        return classes
+
+    def dirty_properties(self) -> Set[Node]:
+        """
+        The shape paths merge_same_property has to process this round.
+        """
+        delta = self._since("properties")
+        new_classes = self.target_classes - self._property_seen
+        self._property_seen = set(self.target_classes)
+        if delta is None:
+            dirty = set(self.path_value)
+        else:
+            nodes: Set[Node] = set()  # subjects and objects of the new triples
+            triples: Dict[Node, List[Triple]] = {}  # predicate -> its new triples
+            for t in delta:
+                # reflexive links (target_range adds p rdfs:subPropertyOf p) are
+                # only removed again, which the linked paths below take care of
+                if t[0] != t[2]:
+                    nodes.add(t[0])
+                    nodes.add(t[2])
+                triples.setdefault(t[1], []).append(t)
+            dirty = {
+                p for p in self.path_value
+                if p in nodes or self._property_fires(p, triples, new_classes) or _path_linked(self.g, p)
+            }
+        if self._round is not None:
+            self._round["properties"] = len(dirty)
+        return dirty
+
+    def _property_fires(self, p: Node, triples: Dict[Node, List[Triple]], new_classes: Set[Node]) -> bool:
+        # p itself is unchanged (not the subject/object of a new triple):
+        # whether its new triples, or those of its inverses, give the
+        # merge_same_property checks anything to do
+        g = self.g
+        domains = set(g.objects(p, RDFS.domain))
+        ranges = set(g.objects(p, RDFS.range))
+        if not new_classes.isdisjoint(domains) or not new_classes.isdisjoint(ranges):
+            return True
+        inverses = set(g.subjects(OWL.inverseOf, p)) | set(g.objects(p, OWL.inverseOf))
+        if any(q in triples for q in inverses):
+            return True
+        new = triples.get(p)
+        if not new:
+            return False
+        if inverses or any((p, RDF.type, t) in g for t in _PROPERTY_RULES):
+            return True
+        # only prp-dom / prp-rng left
+        focus, classes = self.focus_nodes, self.target_classes
+        for x, _, y in new:
+            for c in domains:
+                if (x, RDF.type, c) not in g or (c in classes and x not in focus):
+                    return True
+            for c in ranges:
+                if (y, RDF.type, c) not in g or (c in classes and y not in focus):
+                    return True
+        return False
+
+    def focus_dirty(self) -> bool:
+        """
+        Whether merge_same_focus_all can merge anything: new owl:sameAs triples or focus nodes.
+        """
+        delta = self._since("focus")
+        count, self._focus_count = self._focus_count, len(self.focus_nodes)
+        return count != len(self.focus_nodes) or any(p == OWL.sameAs for _, p, _ in delta)
+
+    def focus_merged(self) -> None:
+        """
+        To call after merge_same_focus_all: on a canonical_view the merge
+        wrote nothing, the triples of the representatives are logged instead.
+        """
+        store = self.g.store
+        if not isinstance(store, CanonicalStore):
+            return
+        fresh = list(store.canon)[self._view_merged:]
+        self._view_merged = len(store.canon)
+        for rep in {store.canon[x] for x in fresh}:
+            self.delta.extend(self.g.triples((rep, None, None)))
+            self.delta.extend(self.g.triples((None, None, rep)))
+
+    def linked_dirty(self) -> bool:
+        """
+        Whether the sh:node paths got new triples, i.e. new objects to add as focus nodes.
+        """
+        delta = self._since("linked")
+        return any(p in self.shape_linked_target for _, p, _ in delta)
+
+    def close(self) -> None:
+        self._close_round()
+        self.delta.close()
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from typing import Dict, List
+
+from rdflib import Graph
+from rdflib.namespace import OWL
+from rdflib.term import Node
+
+
+def link_functional(g: Graph, p: Node, inverse: bool = False) -> int:
+    """
+    owl:sameAs links implied by a functional property `p` (rule prp-fp:
+    the values of one subject are the same), or by an inverse-functional
+    one with inverse=True (rule prp-ifp: the subjects of one value are the
+    same).
+
+    The groups are collected in one scan of the p triples. Each group of k
+    distinct terms is linked to its first member both ways, 2(k-1)
+    triples instead of k(k-1) for every ordered pair; every member stays
+    the subject of an owl:sameAs, as merge_same_focus_all expects.
+
+    Returns the number of sameAs triples written.
+    """
+    # triples are distinct, so are the members of a group
+    groups: Dict[Node, List[Node]] = {}
+    for s, o in g.subject_objects(p):
+        key, member = (o, s) if inverse else (s, o)
+        groups.setdefault(key, []).append(member)
+
+    links = []
+    for group in groups.values():
+        rep = group[0]
+        for member in group[1:]:
+            links.append((rep, OWL.sameAs, member, g))
+            links.append((member, OWL.sameAs, rep, g))
+    g.addN(links)
+    return len(links)
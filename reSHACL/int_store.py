@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from rdflib import Graph
+from rdflib.store import Store
+from rdflib.term import Node
+
+Triple = Tuple[Node, Node, Node]
+# first -> second -> third(s), all term IDs; a single third is kept as a
+# bare int, most (s, p) / (p, o) / (o, s) pairs have only one
+Index = Dict[int, Dict[int, Union[int, Set[int]]]]
+
+
+def _index_add(index: Index, a: int, b: int, c: int) -> None:
+    inner = index.get(a)
+    if inner is None:
+        index[a] = {b: c}
+        return
+    values = inner.get(b)
+    if values is None:
+        inner[b] = c
+    elif type(values) is int:
+        if values != c:
+            inner[b] = {values, c}
+    else:
+        values.add(c)
+
+
+def _index_remove(index: Index, a: int, b: int, c: int) -> None:
+    inner = index[a]
+    values = inner[b]
+    if type(values) is int:
+        del inner[b]
+    else:
+        values.discard(c)
+        if len(values) == 1:
+            inner[b] = values.pop()
+    if not inner:
+        del index[a]
+
+
+def _values(values: Union[int, Set[int]]) -> Iterable[int]:
+    # a copy: callers write to the store while iterating
+    return (values,) if type(values) is int else list(values)
+
+
+def _has(values: Union[None, int, Set[int]], c: int) -> bool:
+    if values is None:
+        return False
+    return values == c if type(values) is int else c in values
+
+
+class IntegerStore(Store):
+    """
+    Triple store over interned terms: every term is numbered once, and the
+    SPO, POS and OSP indexes hold those numbers, so lookups and joins hash
+    and compare small ints instead of rdflib terms. Terms are encoded on the
+    way in and decoded on the way out; the Graph API is unchanged.
+
+    The store holds a single graph and ignores the context asked for; like
+    the canonical_view it declares itself context/graph aware so pyshacl
+    can validate it in place, and reports every triple in its `context`.
+    """
+
+    context_aware = True
+    formula_aware = False
+    transaction_aware = False
+    graph_aware = True
+
+    def __init__(self, configuration=None, identifier=None):
+        super().__init__(configuration)
+        self.identifier = identifier
+        self.terms: List[Node] = []
+        self.ids: Dict[Node, int] = {}
+        self._spo: Index = {}
+        self._pos: Index = {}
+        self._osp: Index = {}
+        self._count = 0
+        self._namespaces: Dict[str, object] = {}
+        self._prefixes: Dict[object, str] = {}
+        # pyshacl finds the graph of a blank node through Dataset.quads()
+        self.context = Graph(store=self, identifier=identifier)
+
+    # ----------------------------
+    # Interning
+    # ----------------------------
+    def intern(self, term: Node) -> int:
+        i = self.ids.get(term)
+        if i is None:
+            i = self.ids[term] = len(self.terms)
+            self.terms.append(term)
+        return i
+
+    def contains_triple(self, triple: Triple) -> bool:
+        ids = self.ids
+        s, p, o = ids.get(triple[0]), ids.get(triple[1]), ids.get(triple[2])
+        if s is None or p is None or o is None:
+            return False
+        return _has(self._spo.get(s, {}).get(p), o)
+
+    def insert(self, s: int, p: int, o: int) -> None:
+        """
+        Adds a triple of term IDs, without events.
+        """
+        if _has(self._spo.get(s, {}).get(p), o):
+            return
+        _index_add(self._spo, s, p, o)
+        _index_add(self._pos, p, o, s)
+        _index_add(self._osp, o, s, p)
+        self._count += 1
+
+    # ----------------------------
+    # Store API
+    # ----------------------------
+    def add(self, triple: Triple, context=None, quoted: bool = False) -> None:
+        # dispatches TripleAddedEvent before inserting, as Memory does
+        Store.add(self, triple, context, quoted)
+        intern = self.intern
+        self.insert(intern(triple[0]), intern(triple[1]), intern(triple[2]))
+
+    def addN(self, quads) -> None:
+        for s, p, o, c in quads:
+            self.add((s, p, o), c)
+
+    def remove(self, triple_pattern, context=None) -> None:
+        ids = self.ids
+        for (s, p, o), _ in list(self.triples(triple_pattern)):
+            si, pi, oi = ids[s], ids[p], ids[o]
+            _index_remove(self._spo, si, pi, oi)
+            _index_remove(self._pos, pi, oi, si)
+            _index_remove(self._osp, oi, si, pi)
+            self._count -= 1
+
+    def _match(self, s: Optional[int], p: Optional[int], o: Optional[int]) -> Iterator[Tuple[int, int, int]]:
+        if s is not None:
+            inner = self._spo.get(s)
+            if inner is None:
+                return
+            if p is not None:
+                if o is not None:
+                    if _has(inner.get(p), o):
+                        yield s, p, o
+                elif p in inner:
+                    for oo in _values(inner[p]):
+                        yield s, p, oo
+            elif o is not None:
+                predicates = self._osp.get(o, {}).get(s)
+                if predicates is not None:
+                    for pp in _values(predicates):
+                        yield s, pp, o
+            else:
+                for pp, objects in list(inner.items()):
+                    for oo in _values(objects):
+                        yield s, pp, oo
+        elif p is not None:
+            inner = self._pos.get(p)
+            if inner is None:
+                return
+            if o is not None:
+                if o in inner:
+                    for ss in _values(inner[o]):
+                        yield ss, p, o
+            else:
+                for oo, subjects in list(inner.items()):
+                    for ss in _values(subjects):
+                        yield ss, p, oo
+        elif o is not None:
+            for ss, predicates in list(self._osp.get(o, {}).items()):
+                for pp in _values(predicates):
+                    yield ss, pp, o
+        else:
+            for ss, inner in list(self._spo.items()):
+                for pp, objects in list(inner.items()):
+                    for oo in _values(objects):
+                        yield ss, pp, oo
+
+    def triples(self, triple_pattern, context=None) -> Iterator[Tuple[Triple, Iterator]]:
+        ids = []
+        for term in triple_pattern:
+            if term is None:
+                ids.append(None)
+                continue
+            i = self.ids.get(term)
+            if i is None:
+                return  # a term the store has never seen matches nothing
+            ids.append(i)
+        terms = self.terms
+        contexts = (self.context,)
+        for s, p, o in self._match(*ids):
+            yield (terms[s], terms[p], terms[o]), iter(contexts)
+
+    def __len__(self, context=None) -> int:
+        return self._count
+
+    def contexts(self, triple=None):
+        return iter((self.context,))
+
+    def add_graph(self, graph: Graph) -> None:
+        pass
+
+    def remove_graph(self, graph: Graph) -> None:
+        pass
+
+    def bind(self, prefix: str, namespace, override: bool = True) -> None:
+        # same bookkeeping as rdflib's Memory store
+        bound_namespace = self._namespaces.get(prefix)
+        bound_prefix = self._prefixes.get(namespace)
+        if override:
+            if bound_prefix is not None:
+                del self._namespaces[bound_prefix]
+            if bound_namespace is not None:
+                del self._prefixes[bound_namespace]
+            self._prefixes[namespace] = prefix
+            self._namespaces[prefix] = namespace
+        else:
+            self._prefixes[bound_namespace or namespace] = bound_prefix or prefix
+            self._namespaces[bound_prefix or prefix] = bound_namespace or namespace
+
+    def namespace(self, prefix: str):
+        return self._namespaces.get(prefix)
+
+    def prefix(self, namespace) -> Optional[str]:
+        return self._prefixes.get(namespace)
+
+    def namespaces(self):
+        return iter(list(self._namespaces.items()))
+
+
+def integer_graph(g: Graph) -> Graph:
+    """
+    A copy of `g` on an IntegerStore, with the same identifier and prefixes.
+    """
+    store = IntegerStore(identifier=g.identifier)
+    out = Graph(store=store, identifier=g.identifier)
+    for prefix, namespace in g.namespaces():
+        out.bind(prefix, namespace, override=True, replace=True)
+    intern, insert = store.intern, store.insert
+    for s, p, o in g:
+        insert(intern(s), intern(p), intern(o))
+    return out
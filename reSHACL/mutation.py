@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import weakref
+from contextlib import contextmanager
+from typing import Dict, Iterator, Set, Tuple
+
+from rdflib import Graph
+from rdflib.term import Node
+
+Triple = Tuple[Node, Node, Node]
+
+
+class MutationBuffer:
+    """
+    Additions and removals of one rule pass over a graph, applied together
+    by flush(): the removals one by one, the additions with one addN.
+
+    Only the last operation on a triple counts (add then remove = remove),
+    as if they had been applied in order. Reads during the pass do not see
+    the buffered writes, so a rule that needs its own writes has to end
+    its pass (flush) first. flush adds to counts[rule] = [added, removed].
+    """
+
+    def __init__(self, g: Graph, counts: Dict[str, list]):
+        self._graph = g
+        self._ops: Dict[Triple, bool] = {}  # triple -> added (True) / removed (False)
+        self.counts = counts
+
+    def add(self, triple: Triple) -> None:
+        self._ops[triple] = True
+
+    def remove(self, triple: Triple) -> None:
+        self._ops[triple] = False
+
+    def flush(self, rule: str) -> None:
+        if not self._ops:
+            return
+        g = self._graph
+        ops, self._ops = self._ops, {}
+        added = [(s, p, o, g) for (s, p, o), add in ops.items() if add]
+        removed = [t for t, add in ops.items() if not add]
+        for t in removed:
+            g.remove(t)
+        g.addN(added)
+        count = self.counts.setdefault(rule, [0, 0])
+        count[0] += len(added)
+        count[1] += len(removed)
+
+
+# by id(): graphs compare by identifier, which a canonical_view, an
+# overlay or an ontology module shares with its base
+_COUNTS: Dict[int, Dict[str, list]] = {}
+# the graphs with a rule_pass open
+_ACTIVE: Set[int] = set()
+
+
+def _counts_of(g: Graph) -> Dict[str, list]:
+    """
+    The per-rule counts of `g`, one dict per graph object, dropped with it.
+    """
+    counts = _COUNTS.get(id(g))
+    if counts is None:
+        counts = _COUNTS[id(g)] = {}
+        weakref.finalize(g, _COUNTS.pop, id(g), None)
+    return counts
+
+
+@contextmanager
+def rule_pass(g: Graph, rule: str) -> Iterator[MutationBuffer]:
+    """
+    with rule_pass(g, "prp-symp") as buf: ... buf.add(t) ...
+    The writes are applied to `g` when the block exits normally; an
+    exception discards them, so a rule is never half applied. Passes on
+    one graph do not nest: an inner flush would write under the outer
+    pass's iterators.
+    """
+    assert id(g) not in _ACTIVE, f"rule_pass {rule!r} opened inside another pass on the same graph"
+    _ACTIVE.add(id(g))
+    buf = MutationBuffer(g, _counts_of(g))
+    try:
+        yield buf
+    finally:
+        _ACTIVE.discard(id(g))
+    buf.flush(rule)
+
+
+def mutation_counts(g: Graph) -> Dict[str, Dict[str, int]]:
+    """
+    { rule -> {"added": n, "removed": m} } for the passes run on `g` so far.
+    """
+    return {
+        rule: {"added": added, "removed": removed}
+        for rule, (added, removed) in _counts_of(g).items()
+    }
@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+from typing import Iterable, List, Optional, Set
+
+from rdflib import BNode, Graph, URIRef
+from rdflib.namespace import OWL, RDF, RDFS, SH
+from rdflib.term import Node
+
+# the axioms the builders' rules and the TC engines read
+CLASS_AXIOMS = (RDFS.subClassOf, OWL.equivalentClass)
+PROPERTY_AXIOMS = (RDFS.subPropertyOf, OWL.equivalentProperty, OWL.inverseOf)
+TBOX_PREDICATES = CLASS_AXIOMS + PROPERTY_AXIOMS + (
+    RDFS.domain,
+    RDFS.range,
+    OWL.disjointWith,
+    OWL.complementOf,
+    OWL.propertyDisjointWith,
+)
+TBOX_TYPES = {
+    RDFS.Class,
+    OWL.Class,
+    RDF.Property,
+    OWL.ObjectProperty,
+    OWL.DatatypeProperty,
+    OWL.AnnotationProperty,
+    OWL.FunctionalProperty,
+    OWL.InverseFunctionalProperty,
+    OWL.SymmetricProperty,
+    OWL.AsymmetricProperty,
+    OWL.TransitiveProperty,
+    OWL.IrreflexiveProperty,
+    OWL.ReflexiveProperty,
+    OWL.Restriction,
+}
+
+# constraints that look at a value node's own triples
+VALUE_NODE_SHAPES = (SH["class"], SH.node, SH.property, SH.qualifiedValueShape, SH["and"], SH["or"], SH["not"], SH.xone)
+TARGETS = (SH.targetClass, SH.targetNode, SH.targetSubjectsOf, SH.targetObjectsOf)
+_VOCABULARIES = (str(RDF), str(RDFS), str(OWL))
+
+
+def _is_vocabulary(term: Node) -> bool:
+    return isinstance(term, URIRef) and str(term).startswith(_VOCABULARIES)
+
+
+def _path_terms(shacl_graph: Graph, path: Node) -> Set[Node]:
+    # the IRIs of a (possibly complex) sh:path, through its blank nodes and lists
+    out: Set[Node] = set()
+    todo = [path]
+    seen: Set[Node] = set()
+    while todo:
+        node = todo.pop()
+        if node in seen:
+            continue
+        seen.add(node)
+        if isinstance(node, URIRef):
+            if node != RDF.nil:
+                out.add(node)
+        elif isinstance(node, BNode):
+            todo.extend(shacl_graph.objects(node, None))
+    return out
+
+
+def unsafe_reason(shacl_graph: Graph, ontology: Graph) -> Optional[str]:
+    """
+    Why the shapes could depend on ontology triples outside any signature
+    module, or None. The module is then the whole ontology.
+    """
+    if (None, SH.closed, None) in shacl_graph:
+        # the final super-property pass adds predicates a closed shape rejects
+        return "sh:closed"
+    for p in (SH.sparql, SH.target, SH.select):
+        if (None, p, None) in shacl_graph:
+            return f"SPARQL-based {shacl_graph.qname(p)}"
+
+    for _, p, o in shacl_graph.triples((None, None, None)):
+        if p not in TARGETS and p != SH["class"]:
+            continue
+        # targets (or class constraints) that can select ontology entities
+        if _is_vocabulary(o):
+            return f"{shacl_graph.qname(p)} {o}"
+        if p == SH.targetNode and ((o, None, None) in ontology or (None, None, o) in ontology):
+            return f"sh:targetNode {o} in the ontology"
+        if p in (SH.targetSubjectsOf, SH.targetObjectsOf) and (None, o, None) in ontology:
+            return f"{shacl_graph.qname(p)} {o} used in the ontology"
+
+    # paths through the ontology vocabulary whose value nodes are checked
+    for shape, path in shacl_graph.subject_objects(SH.path):
+        if any(_is_vocabulary(t) and t not in (RDFS.label, RDFS.comment) for t in _path_terms(shacl_graph, path)):
+            if any((shape, p, None) in shacl_graph for p in VALUE_NODE_SHAPES):
+                return f"value nodes of sh:path {path} checked"
+    return None
+
+
+def signature(shacl_graph: Graph) -> Set[Node]:
+    """
+    Every IRI of the shapes graph: target classes, sh:class values, path
+    properties and whatever else a constraint names (sh:in, sh:hasValue, ...).
+    """
+    sig: Set[Node] = set()
+    for t in shacl_graph:
+        for term in t:
+            if isinstance(term, URIRef) and not str(term).startswith(str(SH)):
+                sig.add(term)
+    return sig
+
+
+# (predicate, direction) steps of the closures below: "in" follows a link
+# from its object to its subject, "out" the other way, "both" either
+_CLASS_DOWN = ((RDFS.subClassOf, "in"), (OWL.equivalentClass, "both"), (OWL.sameAs, "both"))
+_PROPERTY_UP = ((RDFS.subPropertyOf, "out"), (OWL.equivalentProperty, "both"), (OWL.sameAs, "both"), (OWL.inverseOf, "both"))
+_PROPERTY_DOWN = ((RDFS.subPropertyOf, "in"), (OWL.equivalentProperty, "both"), (OWL.sameAs, "both"), (OWL.inverseOf, "both"))
+
+
+def _reach(ontology: Graph, start: Iterable[Node], steps) -> Set[Node]:
+    out = set(start)
+    todo = list(out)
+    while todo:
+        e = todo.pop()
+        for p, direction in steps:
+            found: List[Node] = []
+            if direction != "out":
+                found.extend(ontology.subjects(p, e))
+            if direction != "in":
+                found.extend(ontology.objects(e, p))
+            for x in found:
+                # never through owl:Thing & co, that would pull in everything
+                if x not in out and not _is_vocabulary(x):
+                    out.add(x)
+                    todo.append(x)
+    return out
+
+
+def close_signature(ontology: Graph, seed: Iterable[Node]) -> Set[Node]:
+    """
+    `seed` closed over what the rules can derive towards it, as the
+    builders walk the ontology:
+      - classes: their subclasses and equivalent classes (the TC engines
+        and sh:class);
+      - properties: up to their super-properties (merged as paths too),
+        then down to all sub/equivalent/inverse properties of those, and
+        of the properties whose domain or range is a signature class.
+    """
+    seed = set(seed)
+    classes = _reach(ontology, seed, _CLASS_DOWN)
+    typed = set()
+    for c in classes:
+        typed.update(ontology.subjects(RDFS.domain, c))
+        typed.update(ontology.subjects(RDFS.range, c))
+    properties = _reach(ontology, _reach(ontology, seed, _PROPERTY_UP) | typed, _PROPERTY_DOWN)
+    return classes | properties
+
+
+def tbox_subjects(ontology: Graph) -> Set[Node]:
+    """
+    The classes and properties the ontology defines: subjects of a schema
+    axiom or typed with a schema type. Everything else is individual data.
+    """
+    out: Set[Node] = set()
+    for p in TBOX_PREDICATES:
+        out.update(ontology.subjects(p, None))
+    for t in TBOX_TYPES:
+        out.update(ontology.subjects(RDF.type, t))
+    return out
+
+
+def _is_anonymous_individual(ontology: Graph, node: BNode) -> bool:
+    # a blank node typed with a user class (or owl:Thing, owl:NamedIndividual),
+    # or an untyped one nothing points to: not a class or property expression,
+    # so a target can select it on its own
+    types = set(ontology.objects(node, RDF.type))
+    if types:
+        return any(not _is_vocabulary(t) or t in (OWL.Thing, OWL.NamedIndividual) for t in types)
+    return (None, None, node) not in ontology
+
+
+def ontology_module(ontology: Graph, shacl_graph: Graph, stats: Optional[dict] = None) -> Graph:
+    """
+    The part of `ontology` the shapes can depend on: every triple about a
+    term of the closed signature (close_signature(signature(shapes))),
+    every triple about an individual (anonymous ones included), and the
+    blank nodes those reach.
+    A class or property also typed with a user class (punning, e.g.
+    `ex:Dog a owl:Class, ex:Species`) counts as an individual.
+    Returns `ontology` itself when unsafe_reason finds the shapes could
+    depend on more.
+
+    stats, if given, gets "ontology_triples", "module_triples",
+    "signature" and "fallback" (the reason, or None).
+    """
+    reason = unsafe_reason(shacl_graph, ontology)
+    if reason is not None:
+        if stats is not None:
+            stats.update(ontology_triples=len(ontology), module_triples=len(ontology), signature=None, fallback=reason)
+        return ontology
+
+    sig = close_signature(ontology, signature(shacl_graph))
+    schema = tbox_subjects(ontology)
+    module = Graph(identifier=ontology.identifier)
+    for prefix, namespace in ontology.namespaces():
+        module.bind(prefix, namespace, override=True, replace=True)
+
+    # punned terms: their rdf:type to a user class is data sh:class and targets read
+    punned = {s for s, c in ontology.subject_objects(RDF.type) if s in schema and c not in TBOX_TYPES and not _is_vocabulary(c)}
+    keep: Set[Node] = {
+        s for s in ontology.subjects(unique=True)
+        if s in sig or s in punned or (s not in schema and (not isinstance(s, BNode) or _is_anonymous_individual(ontology, s)))
+    }
+    todo = list(keep)
+    while todo:
+        # concise bounded description: class expressions, lists
+        for o in ontology.objects(todo.pop()):
+            if isinstance(o, BNode) and o not in keep:
+                keep.add(o)
+                todo.append(o)
+    # in the ontology's own order, which later set iteration inherits
+    module.addN((s, p, o, module) for s, p, o in ontology if s in keep)
+
+    if stats is not None:
+        stats.update(ontology_triples=len(ontology), module_triples=len(module), signature=len(sig), fallback=None)
+    return module
+
+
+# the module against the full ontology on anonymous individuals
+def main() -> None:
+    from pyshacl import validate
+
+    from reSHACL.union_store import union_graph
+
+    prefixes = """
+        @prefix ex: <http://example.org/> .
+        @prefix owl: <http://www.w3.org/2002/07/owl#> .
+        @prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+        @prefix sh: <http://www.w3.org/ns/shacl#> .
+        @prefix xsd: <http://www.w3.org/2001/XMLSchema#> .
+    """
+    ontology = Graph().parse(data=prefixes + """
+        ex:T a owl:Class .
+        ex:Other a owl:Class ; rdfs:subClassOf ex:Unrelated .
+        _:b a ex:T ; ex:name "x" .
+    """, format="turtle")
+    shapes = Graph().parse(data=prefixes + """
+        ex:TShape a sh:NodeShape ; sh:targetClass ex:T ;
+            sh:property [ sh:path ex:name ; sh:datatype xsd:integer ] .
+    """, format="turtle")
+    data = Graph().parse(data=prefixes + "ex:a a ex:T ; ex:name 1 .", format="turtle")
+
+    def report(ont: Graph) -> tuple[bool, set]:
+        conforms, results, _ = validate(union_graph(data, ont), shacl_graph=shapes)
+        return conforms, {
+            (results.value(r, SH.focusNode), results.value(r, SH.resultPath), results.value(r, SH.sourceConstraintComponent))
+            for r in results.subjects(RDF.type, SH.ValidationResult)
+        }
+
+    stats: dict = {}
+    module = ontology_module(ontology, shapes, stats=stats)
+    full, reduced = report(ontology), report(module)
+    print(f"module: {stats['module_triples']} of {stats['ontology_triples']} triples")
+    print(f"full ontology: conforms={full[0]}, {len(full[1])} violation(s)")
+    print(f"module: conforms={reduced[0]}, {len(reduced[1])} violation(s)  identical: {full == reduced}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+from rdflib import Graph
+from rdflib.store import Store
+from rdflib.term import Node
+
+from .int_store import IntegerStore
+
+Triple = Tuple[Node, Node, Node]
+
+
+class OverlayStore(Store):
+    """
+    Copy-on-write view of a base graph: reads go through to the base,
+    writes are kept here. `added` holds the triples added that the base
+    does not have, `removed` the base triples removed (subject -> {(p, o)}).
+    The base itself is never written to, so one parsed graph can back any
+    number of runs. `added` is an IntegerStore: a read for a term it has
+    never seen costs one dict lookup.
+
+    A single context, `context`, which every triple is reported in; like
+    the canonical_view the store declares itself context/graph aware so
+    pyshacl can validate it in place.
+    """
+
+    context_aware = True
+    formula_aware = False
+    transaction_aware = False
+    graph_aware = True
+
+    def __init__(self, base: Graph):
+        super().__init__()
+        self.base = base
+        self.added = IntegerStore()
+        self.removed: Dict[Node, Set[Tuple[Node, Node]]] = {}
+        self._removed_count = 0
+        # pyshacl finds the graph of a blank node through Dataset.quads()
+        self.context = Graph(store=self, identifier=base.identifier)
+
+    def contains_triple(self, triple: Triple) -> bool:
+        if self.added.contains_triple(triple):
+            return True
+        return not self._is_removed(triple) and triple in self.base
+
+    def _is_removed(self, triple: Triple) -> bool:
+        po = self.removed.get(triple[0])
+        return po is not None and (triple[1], triple[2]) in po
+
+    # ----------------------------
+    # Store API
+    # ----------------------------
+    def triples(self, triple_pattern, context=None) -> Iterator[Tuple[Triple, Iterator]]:
+        # straight to the base store, Graph.triples has already resolved paths
+        base, added, removed = self.base, self.added, self.removed
+        contexts = (self.context,)
+        s = triple_pattern[0]
+        if not removed or (s is not None and s not in removed):
+            for t, _ in base.store.triples(triple_pattern, base):
+                yield t, iter(contexts)
+        else:
+            for t, _ in base.store.triples(triple_pattern, base):
+                po = removed.get(t[0])
+                if po is None or (t[1], t[2]) not in po:
+                    yield t, iter(contexts)
+        if len(added):
+            for t, _ in added.triples(triple_pattern):
+                yield t, iter(contexts)
+
+    def __len__(self, context=None) -> int:
+        return len(self.base) - self._removed_count + len(self.added)
+
+    def add(self, triple: Triple, context=None, quoted: bool = False) -> None:
+        # dispatches TripleAddedEvent before inserting, as Memory does
+        Store.add(self, triple, context, quoted)
+        if self._is_removed(triple):
+            po = self.removed[triple[0]]
+            po.discard((triple[1], triple[2]))
+            if not po:
+                del self.removed[triple[0]]
+            self._removed_count -= 1
+        elif triple not in self.base:
+            self.added.add(triple)
+
+    def remove(self, triple_pattern, context=None) -> None:
+        for t, _ in list(self.triples(triple_pattern)):
+            if self.added.contains_triple(t):
+                self.added.remove(t)
+            else:
+                self.removed.setdefault(t[0], set()).add((t[1], t[2]))
+                self._removed_count += 1
+
+    def contexts(self, triple=None):
+        return iter((self.context,))
+
+    def add_graph(self, graph: Graph) -> None:
+        pass
+
+    def remove_graph(self, graph: Graph) -> None:
+        pass
+
+    # prefixes bound on the overlay stay local; the base ones show through
+    def bind(self, prefix, namespace, override: bool = True) -> None:
+        self.added.bind(prefix, namespace, override=override)
+
+    def prefix(self, namespace) -> Optional[str]:
+        prefix = self.added.prefix(namespace)
+        return prefix if prefix is not None else self.base.store.prefix(namespace)
+
+    def namespace(self, prefix):
+        namespace = self.added.namespace(prefix)
+        return namespace if namespace is not None else self.base.store.namespace(prefix)
+
+    def namespaces(self):
+        local = dict(self.added.namespaces())
+        for prefix, namespace in self.base.store.namespaces():
+            if prefix not in local and self.added.prefix(namespace) is None:
+                local[prefix] = namespace
+        return iter(list(local.items()))
+
+
+def overlay_graph(base: Graph) -> Graph:
+    """
+    A Graph over an OverlayStore on `base`: O(1) to create, and writes to
+    it leave `base` unchanged.
+    """
+    return Graph(store=OverlayStore(base), identifier=base.identifier)
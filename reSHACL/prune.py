@@ -0,0 +1,314 @@
+from __future__ import annotations
+
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from rdflib import BNode, Graph, URIRef
+from rdflib.collection import Collection
+from rdflib.namespace import OWL, RDF, RDFS, SH
+from rdflib.term import Node
+
+Triple = Tuple[Node, Node, Node]
+
+# shapes-graph features whose reads of the data graph no walk can bound:
+# SPARQL / JS constraints and targets, custom components, rules
+UNBOUNDED = (SH.sparql, SH.target, SH.parameter, SH.rule, SH.select, SH.ask, SH.jsFunctionName)
+TARGET_PREDICATES = (SH.targetNode, SH.targetClass, SH.targetSubjectsOf, SH.targetObjectsOf)
+# constraints validating their value nodes against other shapes
+SHAPE_REFERENCES = (SH.node, SH.property, SH.qualifiedValueShape, SH["not"])
+SHAPE_LISTS = (SH["and"], SH["or"], SH.xone)
+# property pair constraints: they read the focus node's own values of a predicate
+PROPERTY_PAIRS = (SH.equals, SH.disjoint, SH.lessThan, SH.lessThanOrEquals)
+# _Pruner._step scans a predicate for at least this many nodes, and gives
+# up on the scan after this many triples per node
+SCAN_MIN_NODES = 16
+SCAN_BUDGET = 8
+
+
+class _Unsupported(Exception):
+    pass
+
+
+class _Pruner:
+    """
+    One walk of the shapes over the data graph, collecting in `keep` every
+    triple pyshacl can read while validating: the triples that select focus
+    nodes, those along each shape's sh:path from its focus nodes, the
+    rdf:type triples sh:class looks at, the whole outgoing triples of
+    nodes a closed shape checks, and the blank-node descriptions the report
+    copies for blank focus / value nodes.
+    """
+
+    def __init__(self, graph: Graph, shacl_graph: Graph):
+        self.graph = graph
+        self.sg = shacl_graph
+        self.keep: Dict[Triple, None] = {}  # ordered set
+        self.described: Set[Node] = set()
+        self.plans: Dict[Node, Tuple[Optional[Node], bool, bool, List[Node], List[Node]]] = {}
+        # per shape, the nodes it was / is still to be validated on
+        self.done: Dict[Node, Set[Node]] = {}
+        self.pending: Dict[Node, Set[Node]] = {}
+
+    def run(self) -> int:
+        # the class hierarchy: targetClass and sh:class both walk it
+        for t in self.graph.triples((None, RDFS.subClassOf, None)):
+            self.keep[t] = None
+        focus = 0
+        for shape in self._target_shapes():
+            nodes = self._focus_nodes(shape)
+            focus += len(nodes)
+            self._enqueue(nodes, shape)
+        while self.pending:
+            shape, nodes = self.pending.popitem()
+            self.done.setdefault(shape, set()).update(nodes)
+            self._validate(nodes, shape)
+        return focus
+
+    def ordered(self) -> Iterator[Triple]:
+        """
+        `keep` grouped by subject, each subject's triples in the order the
+        graph lists them: what a node's triples are iterated in (sh:closed
+        results, copied blank nodes) then matches the full graph.
+        """
+        keep = self.keep
+        subjects: Dict[Node, None] = dict.fromkeys(t[0] for t in keep)
+        for s in subjects:
+            for t in self.graph.triples((s, None, None)):
+                if t in keep:
+                    yield t
+
+    def _target_shapes(self) -> List[Node]:
+        shapes: Dict[Node, None] = {}
+        for p in TARGET_PREDICATES:
+            for s in self.sg.subjects(p, None):
+                shapes[s] = None
+        for s in self.sg.subjects(RDF.type, None):
+            if self._implicit_class(s):
+                shapes[s] = None
+        return list(shapes)
+
+    def _implicit_class(self, shape: Node) -> bool:
+        # a shape that is also a class targets its instances
+        classes = {RDFS.Class, OWL.Class}
+        classes.update(self.sg.subjects(RDFS.subClassOf, RDFS.Class))
+        return any(t in classes for t in self.sg.objects(shape, RDF.type))
+
+    def _focus_nodes(self, shape: Node) -> Set[Node]:
+        nodes: Dict[Node, None] = {}
+        for n in self.sg.objects(shape, SH.targetNode):
+            nodes[n] = None
+        classes = list(self.sg.objects(shape, SH.targetClass))
+        if self._implicit_class(shape):
+            classes.append(shape)
+        for c in classes:
+            for sub in self._subclasses(c):
+                for t in self.graph.triples((None, RDF.type, sub)):
+                    self.keep[t] = None
+                    nodes[t[0]] = None
+        for p in self.sg.objects(shape, SH.targetSubjectsOf):
+            for t in self.graph.triples((None, p, None)):
+                self.keep[t] = None
+                nodes[t[0]] = None
+        for p in self.sg.objects(shape, SH.targetObjectsOf):
+            for t in self.graph.triples((None, p, None)):
+                self.keep[t] = None
+                nodes[t[2]] = None
+        return set(nodes)
+
+    def _subclasses(self, c: Node) -> Set[Node]:
+        out = {c}
+        todo = [c]
+        while todo:
+            for s in self.graph.subjects(RDFS.subClassOf, todo.pop()):
+                if s not in out:
+                    out.add(s)
+                    todo.append(s)
+        return out
+
+    def _enqueue(self, nodes: Iterable[Node], shape: Node) -> None:
+        new = set(nodes) - self.done.get(shape, set())
+        if new:
+            self.pending.setdefault(shape, set()).update(new)
+
+    def _plan(self, shape: Node) -> Tuple[Optional[Node], bool, bool, List[Node], List[Node]]:
+        # what _validate reads of a shape, looked up once per shape
+        plan = self.plans.get(shape)
+        if plan is not None:
+            return plan
+        sg = self.sg
+        nested: List[Node] = []
+        for p in SHAPE_REFERENCES:
+            nested.extend(sg.objects(shape, p))
+        for p in SHAPE_LISTS:
+            for lst in sg.objects(shape, p):
+                nested.extend(Collection(sg, lst))
+        if (shape, SH.qualifiedValueShapesDisjoint, None) in sg:
+            # sibling qualified shapes are evaluated on these values too
+            for parent in sg.subjects(SH.property, shape):
+                for sibling in sg.objects(parent, SH.property):
+                    nested.extend(sg.objects(sibling, SH.qualifiedValueShape))
+        pairs = [other for p in PROPERTY_PAIRS for other in sg.objects(shape, p)]
+        plan = self.plans[shape] = (
+            sg.value(shape, SH.path),
+            (shape, SH.closed, None) in sg,
+            (shape, SH["class"], None) in sg,
+            nested,
+            pairs,
+        )
+        return plan
+
+    def _validate(self, focus: Set[Node], shape: Node) -> None:
+        # all of a shape's new focus nodes at once: which focus node a value
+        # comes from does not change what is read next
+        path, closed, classes, nested, pairs = self._plan(shape)
+        values = focus if path is None else self._walk(focus, path, False)
+        for v in focus | values:
+            self._describe(v)
+        for v in values:
+            if classes:
+                for t in self.graph.triples((v, RDF.type, None)):
+                    self.keep[t] = None
+            if closed:
+                # any of these may be reported, blank values with their description
+                for t in self.graph.triples((v, None, None)):
+                    self.keep[t] = None
+                    self._describe(t[2])
+        for sub in nested:
+            self._enqueue(values, sub)
+        for other in pairs:
+            for f in focus:
+                for t in self.graph.triples((f, other, None)):
+                    self.keep[t] = None
+                    self._describe(t[2])
+
+    def _walk(self, nodes: Set[Node], path: Node, inverse: bool) -> Set[Node]:
+        """
+        The values of `path` from `nodes` (reversed when `inverse`), keeping
+        the triples it goes through.
+        """
+        sg = self.sg
+        if isinstance(path, URIRef):
+            out: Set[Node] = set()
+            for t in self._step(nodes, path, inverse):
+                self.keep[t] = None
+                out.add(t[0] if inverse else t[2])
+            return out
+        if not isinstance(path, BNode):
+            raise _Unsupported(f"sh:path {path}")
+
+        if (path, RDF.first, None) in sg:
+            steps = list(Collection(sg, path))
+            for step in reversed(steps) if inverse else steps:
+                nodes = self._walk(nodes, step, inverse)
+            return nodes
+        inner = sg.value(path, SH.inversePath)
+        if inner is not None:
+            return self._walk(nodes, inner, not inverse)
+        inner = sg.value(path, SH.alternativePath)
+        if inner is not None:
+            out = set()
+            for alternative in Collection(sg, inner):
+                out |= self._walk(nodes, alternative, inverse)
+            return out
+        inner = sg.value(path, SH.zeroOrOnePath)
+        if inner is not None:
+            return nodes | self._walk(nodes, inner, inverse)
+        for p, reflexive in ((SH.zeroOrMorePath, True), (SH.oneOrMorePath, False)):
+            inner = sg.value(path, p)
+            if inner is not None:
+                out = set(nodes) if reflexive else set()
+                frontier = nodes
+                while frontier:
+                    frontier = self._walk(frontier, inner, inverse) - out
+                    out |= frontier
+                return out
+        raise _Unsupported(f"sh:path {path}")
+
+    def _step(self, nodes: Set[Node], p: Node, inverse: bool) -> List[Triple]:
+        # the p triples from (or, inverse, to) nodes. Many nodes: one scan
+        # of p, abandoned once it has read SCAN_BUDGET triples per node, so
+        # a large p costs at most about as much again as the lookups
+        if len(nodes) >= SCAN_MIN_NODES:
+            budget = SCAN_BUDGET * len(nodes)
+            end = 2 if inverse else 0
+            found: List[Triple] = []
+            for t in self.graph.triples((None, p, None)):
+                budget -= 1
+                if budget < 0:
+                    break
+                if t[end] in nodes:
+                    found.append(t)
+            else:
+                return found
+        found = []
+        for n in nodes:
+            found.extend(self.graph.triples((None, p, n) if inverse else (n, p, None)))
+        return found
+
+    def _describe(self, node: Node) -> None:
+        # the report copies a blank focus / value node with its description
+        if not isinstance(node, BNode):
+            return
+        todo = [node]
+        while todo:
+            n = todo.pop()
+            if not isinstance(n, BNode) or n in self.described:
+                continue
+            self.described.add(n)
+            for t in self.graph.triples((n, None, None)):
+                self.keep[t] = None
+                todo.append(t[2])
+
+
+def unbounded_reason(shacl_graph: Graph, inference: str = "none") -> Optional[str]:
+    """
+    Why validating with these shapes may read beyond what _Pruner walks,
+    or None.
+    """
+    if inference and str(inference) != "none":
+        return f"inference={inference}"
+    for p in UNBOUNDED:
+        if (None, p, None) in shacl_graph:
+            return f"uses {shacl_graph.qname(p)}"
+    return None
+
+
+def prune_for_validation(graph: Graph, shacl_graph: Graph, inference: str = "none", stats: Optional[dict] = None) -> Graph:
+    """
+    The subgraph of `graph` that validating it against `shacl_graph` reads,
+    in a plain Memory graph: pyshacl gives the same report on it as on
+    `graph`, without the ontology and the triples no shape reaches, and its
+    lookups skip the builders' store layers. Returns `graph` itself when
+    the shapes can read more than the walk bounds (unbounded_reason, or a
+    path form it does not know).
+
+    stats, if given, gets "graph_triples", "pruned_triples" (what is left),
+    "focus_nodes", "seconds" and "fallback" (the reason, or None).
+    """
+    t0 = time.perf_counter()
+    reason = unbounded_reason(shacl_graph, inference)
+    pruned = graph
+    focus = 0
+    if reason is None:
+        pruner = _Pruner(graph, shacl_graph)
+        try:
+            focus = pruner.run()
+        except _Unsupported as e:
+            reason = str(e)
+        else:
+            # same prefixes: the text report qnames nodes through them
+            pruned = Graph(bind_namespaces="none", identifier=graph.identifier)
+            for prefix, namespace in graph.namespaces():
+                pruned.bind(prefix, namespace, override=True, replace=True)
+            pruned.addN((s, p, o, pruned) for s, p, o in pruner.ordered())
+
+    if stats is not None:
+        total = len(graph)
+        stats.update(
+            graph_triples=total,
+            pruned_triples=len(pruned) if reason is None else total,
+            focus_nodes=focus,
+            seconds=time.perf_counter() - t0,
+            fallback=reason,
+        )
+    return pruned
@@ -8,9 +8,21 @@ from rdflib.namespace import OWL, RDF, RDFS, SH
 from rdflib import Graph
 from pyshacl.shapes_graph import ShapesGraph
 
-from tc_engine.engine_rdflib import expand_target_classes_cached
-
-from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Set, Tuple, Union
+from tc_engine.planner import choose_engine
+from tc_engine.disk_cache import ClosureStore
+from tc_engine.engine_property import PropertyClosure
+from .union_find import merge_same_focus_all
+from .canonical_store import canonical_view
+from .fixpoint import Worklist
+from .functional import link_functional
+from .int_store import integer_graph
+from .mutation import mutation_counts, rule_pass
+from .nt_loader import local_path
+from .shape_index import ShapeIndex
+from .snapshot import SNAPSHOTS, is_quad_source
+from .transitive import materialize_transitive
+
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Set, Tuple, Union
 
 from pyshacl.monkey import rdflib_bool_patch, rdflib_bool_unpatch
 from pyshacl.rdfutil import (
@@ -20,7 +32,6 @@ from pyshacl.consts import (
     SH_path,
     SH_node,
     RDFS_subClassOf,
-    SH_targetNode,
 )
 SH_class = SH["class"]
 
@@ -43,12 +54,21 @@ def load_graph(data_graph: Union[GraphLike, str, bytes],
     shacl_graph_format: Optional[str] = None,
     ):
     
+    # local single-graph files are read through their parsed-graph snapshots
+    data_path = local_path(data_graph)
+    if data_path is not None and not is_quad_source(data_path, data_graph_format):
+        data_graph = SNAPSHOTS.parse(
+            rdflib.Graph(identifier=data_path.absolute().as_uri()), data_path, format=data_graph_format)
     loaded_dg = load_from_source(data_graph, rdf_format=data_graph_format, multigraph=True, do_owl_imports=False)
     if not isinstance(loaded_dg, rdflib.Graph):
         raise RuntimeError("data_graph must be a rdflib Graph object")
 
     if shacl_graph is not None:
         rdflib_bool_patch()
+        shacl_path = local_path(shacl_graph)
+        if shacl_path is not None and not is_quad_source(shacl_path, shacl_graph_format):
+            shacl_graph = SNAPSHOTS.parse(
+                rdflib.Graph(identifier=shacl_path.absolute().as_uri()), shacl_path, format=shacl_graph_format)
         loaded_sg = load_from_source(
             shacl_graph, rdf_format=shacl_graph_format, multigraph=False, do_owl_imports=False)
         rdflib_bool_unpatch()
@@ -76,8 +96,9 @@ def load_graph(data_graph: Union[GraphLike, str, bytes],
 
 def check_symmetricProperty(g, p): # RULE prp-symp
     if (p, RDF.type, OWL.SymmetricProperty) in g:
-        for x, y in g.subject_objects(p):
-            g.add((y, p, x))
+        with rule_pass(g, "prp-symp") as buf:
+            for x, y in g.subject_objects(p):
+                buf.add((y, p, x))
         #g.remove((p, RDF.type, OWL.SymmetricProperty))
     
 
@@ -90,12 +111,9 @@ def check_asymmetricProperty(g, p): # prp-asyp
                     % (p, x, y)
                 )
    
-def check_transitiveProperty(g, p):    
+def check_transitiveProperty(g, p): # RULE prp-trp
     if (p, RDF.type, OWL.TransitiveProperty) in g: 
-        for s, o in g.subject_objects(p):
-            trans = g.transitive_objects(o, p)
-            for oo in trans:          
-                g.add((s, p, oo))  
+        materialize_transitive(g, p)
                 
 def check_propertyDisjointWith(g, focus_property): # prp-pdw
     for p in g.objects(focus_property, OWL.propertyDisjointWith):
@@ -117,178 +135,162 @@ def check_propertyDisjointWith(g, focus_property): # prp-pdw
     
     
 def check_inverseOf(g, focus_property): 
+    # one pass per direction: the second one reads the triples of the first
     for p1 in g.subjects(OWL.inverseOf, focus_property): 
-        for x, y in g.subject_objects(p1):
-            g.add((y, focus_property, x))
-        for xx, yy in g.subject_objects(focus_property):
-            g.add((yy, p1, xx))
+        with rule_pass(g, "prp-inv") as buf:
+            for x, y in g.subject_objects(p1):
+                buf.add((y, focus_property, x))
+        with rule_pass(g, "prp-inv") as buf:
+            for xx, yy in g.subject_objects(focus_property):
+                buf.add((yy, p1, xx))
     for p2 in g.objects(focus_property, OWL.inverseOf): 
-        for x, y in g.subject_objects(p2):
-            g.add((y, focus_property, x))
-        for xx, yy in g.subject_objects(focus_property):
-            g.add((yy, p2, xx))
+        with rule_pass(g, "prp-inv") as buf:
+            for x, y in g.subject_objects(p2):
+                buf.add((y, focus_property, x))
+        with rule_pass(g, "prp-inv") as buf:
+            for xx, yy in g.subject_objects(focus_property):
+                buf.add((yy, p2, xx))
         
     
 def check_domain_range(g, p, target_nodes, same_nodes, target_classes):
     for o in g.objects(p, RDFS.domain): # RULE prp-dom  
-        for x, y in g.subject_objects(p):
-            g.add((x, RDF.type, o))
-            if (o in target_classes) and (not x in target_nodes):
-                target_nodes.add(x)
-                same_set = set()
-                same_nodes.update({x: same_set})
+        with rule_pass(g, "prp-dom") as buf:
+            for x, y in g.subject_objects(p):
+                buf.add((x, RDF.type, o))
+                if (o in target_classes) and (not x in target_nodes):
+                    target_nodes.add(x)
+                    same_set = set()
+                    same_nodes.update({x: same_set})
 
 
     for o in g.objects(p, RDFS.range): # RULE prp-rng
-        for x, y in g.subject_objects(p):
-            g.add((y, RDF.type, o))
-            if (o in target_classes) and (not y in target_nodes):
-                target_nodes.add(y)
-                same_set = set()
-                same_nodes.update({y: same_set})
+        with rule_pass(g, "prp-rng") as buf:
+            for x, y in g.subject_objects(p):
+                buf.add((y, RDF.type, o))
+                if (o in target_classes) and (not y in target_nodes):
+                    target_nodes.add(y)
+                    same_set = set()
+                    same_nodes.update({y: same_set})
                     
     return target_nodes
 
 
-def target_range(g, target_nodes, same_nodes, target_classes):
+def target_range(g, target_nodes, same_nodes, target_classes, prop_closure=None):
+    if prop_closure is None:
+        prop_closure = PropertyClosure(g)
     for c in target_classes:
-        #range
-        for pp in g.subjects( RDFS.range, c):
+        with rule_pass(g, "target-rng") as buf:
+            #range
+            # listed first: prop_closure.add writes to g
+            for pp in list(g.subjects(RDFS.range, c)):
             
-            ep_lis = { s for s in g.transitive_subjects(OWL.equivalentProperty, pp)}
-                        
-            ep2 = {s for s in g.transitive_objects(pp, OWL.equivalentProperty)}
-            
-            ep_lis = ep_lis.union(ep2)
-            for ep in ep_lis:
+                for ep in prop_closure.equivalents(pp):
               
-                g.add((ep, RDFS_subPropertyOf, pp))
+                    prop_closure.add((ep, RDFS_subPropertyOf, pp))
             
             
-            sp = g.transitive_subjects(RDFS_subPropertyOf, pp)
-            for subp in sp:
-                ep1 = { s for s in g.transitive_subjects(OWL.equivalentProperty, subp)}
-               
-                            
-                ep3 = { s for s in g.transitive_objects(subp, OWL.equivalentProperty)}
-                
-                ep1 = ep1.union(ep3)
-                for ep in ep1:
+                sp = prop_closure.sub_properties(pp)
+                for subp in sp:
+                    for ep in prop_closure.equivalents(subp):
                    
-                    for ss, oo in g.subject_objects(ep):
-                        g.add((oo, RDF.type, c))
+                        for ss, oo in g.subject_objects(ep):
+                            buf.add((oo, RDF.type, c))
+                            if not oo in target_nodes:
+                                target_nodes.add(oo)
+                                same_set = set()
+                                same_nodes.update({oo: same_set})
+                
+    
+                    for ss, oo in g.subject_objects(subp):
+                        buf.add((oo, RDF.type, c))
                         if not oo in target_nodes:
                             target_nodes.add(oo)
                             same_set = set()
                             same_nodes.update({oo: same_set})
-                
-    
-                for ss, oo in g.subject_objects(subp):
-                    g.add((oo, RDF.type, c))
+            
+                for s1, oo in g.subject_objects(pp):
+                    buf.add((oo, RDF.type, c))
                     if not oo in target_nodes:
                         target_nodes.add(oo)
                         same_set = set()
-                        same_nodes.update({oo: same_set})
-            
-            for s1, oo in g.subject_objects(pp):
-                g.add((oo, RDF.type, c))
-                if not oo in target_nodes:
-                    target_nodes.add(oo)
-                    same_set = set()
-                    same_nodes.update({oo: same_set})        
+                        same_nodes.update({oo: same_set})        
     
-def target_domain_range(g, target_nodes, same_nodes, target_classes):
+def target_domain_range(g, target_nodes, same_nodes, target_classes, prop_closure=None):
+    if prop_closure is None:
+        prop_closure = PropertyClosure(g)
     for c in target_classes:
-        #range
-        for pp in g.subjects( RDFS.range, c):
+        with rule_pass(g, "target-dom-rng") as buf:
+            #range
+            for pp in g.subjects( RDFS.range, c):
             
-            ep_lis = { s for s in g.transitive_subjects(OWL.equivalentProperty, pp)}
-                        
-            ep2 = {s for s in g.transitive_objects(pp, OWL.equivalentProperty)}
-            
-            ep_lis = ep_lis.union(ep2)
-            for ep in ep_lis:
+                for ep in prop_closure.equivalents(pp):
               
-                for ss, oo in g.subject_objects(ep):
-                    g.add((oo, RDF.type, c))
-                    if not oo in target_nodes:
-                        target_nodes.add(oo)
-                        same_set = set()
-                        same_nodes.update({oo: same_set})
+                    for ss, oo in g.subject_objects(ep):
+                        buf.add((oo, RDF.type, c))
+                        if not oo in target_nodes:
+                            target_nodes.add(oo)
+                            same_set = set()
+                            same_nodes.update({oo: same_set})
             
             
-            sp = g.transitive_subjects(RDFS_subPropertyOf, pp)
-            for subp in sp:
-                ep1 = { s for s in g.transitive_subjects(OWL.equivalentProperty, subp)}
-               
-                            
-                ep3 = { s for s in g.transitive_objects(subp, OWL.equivalentProperty)}
-                
-                ep1 = ep1.union(ep3)
-                for ep in ep1:
+                sp = prop_closure.sub_properties(pp)
+                for subp in sp:
+                    for ep in prop_closure.equivalents(subp):
                     
-                    for ss, oo in g.subject_objects(ep):
-                        g.add((oo, RDF.type, c))
+                        for ss, oo in g.subject_objects(ep):
+                            buf.add((oo, RDF.type, c))
+                            if not oo in target_nodes:
+                                target_nodes.add(oo)
+                                same_set = set()
+                                same_nodes.update({oo: same_set})
+                
+            
+                    for ss, oo in g.subject_objects(subp):
+                        buf.add((oo, RDF.type, c))
                         if not oo in target_nodes:
                             target_nodes.add(oo)
                             same_set = set()
                             same_nodes.update({oo: same_set})
-                
             
-                for ss, oo in g.subject_objects(subp):
-                    g.add((oo, RDF.type, c))
+                for s1, oo in g.subject_objects(pp):
+                    buf.add((oo, RDF.type, c))
                     if not oo in target_nodes:
                         target_nodes.add(oo)
                         same_set = set()
                         same_nodes.update({oo: same_set})
             
-            for s1, oo in g.subject_objects(pp):
-                g.add((oo, RDF.type, c))
-                if not oo in target_nodes:
-                    target_nodes.add(oo)
-                    same_set = set()
-                    same_nodes.update({oo: same_set})
-            
              
-        #domain
-        for p in g.subjects(RDFS.domain, c):
+            #domain
+            # listed first: prop_closure.add writes to g
+            for p in list(g.subjects(RDFS.domain, c)):
             
-            ep1 = {s for s in g.transitive_subjects(OWL.equivalentProperty, p)}
-                        
-            ep2 = { s for s in g.transitive_objects(p, OWL.equivalentProperty)}
-            ep2=ep2.union(ep1)
-            for ep in ep2:
-                g.add((ep, RDFS_subPropertyOf, p))
+                for ep in prop_closure.equivalents(p):
+                    prop_closure.add((ep, RDFS_subPropertyOf, p))
             
-            sp = g.transitive_subjects(RDFS_subPropertyOf, p)
-            for subp in sp:
-                ep3 = { s for s in g.transitive_subjects(OWL.equivalentProperty, subp)}
-                            
-                ep4 = { s for s in g.transitive_objects(subp, OWL.equivalentProperty)}
-                ep3=ep3.union(ep4)
-                for ep in ep3:
+                sp = prop_closure.sub_properties(p)
+                for subp in sp:
+                    for ep in prop_closure.equivalents(subp):
                   
-                    for ss, o in g.subject_objects(ep):
-                        g.add((ss, RDF.type, c))
+                        for ss, o in g.subject_objects(ep):
+                            buf.add((ss, RDF.type, c))
+                            if not ss in target_nodes:
+                                target_nodes.add(ss)
+                                same_set = set()
+                                same_nodes.update({ss: same_set})
+               
+                    for ss, o in g.subject_objects(subp):
+                        buf.add((ss, RDF.type, c))
                         if not ss in target_nodes:
                             target_nodes.add(ss)
                             same_set = set()
                             same_nodes.update({ss: same_set})
-               
-                for ss, o in g.subject_objects(subp):
-                    g.add((ss, RDF.type, c))
-                    if not ss in target_nodes:
-                        target_nodes.add(ss)
-                        same_set = set()
-                        same_nodes.update({ss: same_set})
             
-            for s, o in g.subject_objects(p):
-                if not (s, RDF.type, c) in g:
-                    g.add((s, RDF.type, c))
-                if not s in target_nodes:
-                    target_nodes.add(s)
-                    same_set = set()
-                    same_nodes.update({s: same_set})
+                for s, o in g.subject_objects(p):
+                    buf.add((s, RDF.type, c))
+                    if not s in target_nodes:
+                        target_nodes.add(s)
+                        same_set = set()
+                        same_nodes.update({s: same_set})
         
 
 def check_com_dw(g, class_list):
@@ -351,34 +353,15 @@ def check_irreflexiveProperty(g,p): # RULE prp-irp
 def check_FunctionalProperty(g, focus_property):
     # prp-fp
     if (focus_property, RDF.type, OWL.FunctionalProperty) in g: 
-        for x, y1 in g.subject_objects(focus_property):
-            for y2 in g.objects(x, focus_property):
-                if y1 != y2:
-                    #if y1 in found_node_targets or y2 in found_node_targets
-                    g.add((y1, OWL.sameAs, y2))
+        link_functional(g, focus_property)
       
     
 def check_InverseFunctionalProperty(g, focus_property):
     # prp-ifp
     if (focus_property, RDF.type, OWL.InverseFunctionalProperty) in g:
-        for x1, y in g.subject_objects(focus_property):
-            for x2 in g.subjects(focus_property, y):
-                if x1 != x2:
-                    #if x1 in found_node_targets or x2 in found_node_targets
-                    g.add((x1, OWL.sameAs, x2))
+        link_functional(g, focus_property, inverse=True)
  
 
-def all_samePath_merged(g, path_value):
-    for p in path_value:
-        m1 = [o for o in g.objects(p, OWL.sameAs)]
-        m2 = [s for s in g.subjects(OWL.sameAs, p)]          
-        m3 = [oo for oo in g.objects(p, OWL.equivalentProperty)]
-        m4 = [ss for ss in g.subjects(OWL.equivalentProperty, p)] 
-        m5 = [s for s in g.subjects(RDFS.subPropertyOf, p)]
-        if len(m1)!= 0 or len(m2)!= 0 or len(m3)!= 0 or len(m4) != 0 or len(m5) != 0:
-            return False 
-    return True
-
 def all_property_merged(g, property):
     m1 = [o for o in g.objects(property, OWL.sameAs)]
     if len(m1)!= 0:
@@ -394,17 +377,6 @@ def all_property_merged(g, property):
         return False 
     return True 
   
-def all_focus_merged(g, focus, target_nodes):
-
-    m1 = [o for o in g.objects(focus, OWL.sameAs)] # focus node = o exists
-    if len(m1)!= 0:
-        return False
-    m2 = [s for s in g.subjects(OWL.sameAs, focus)] # s = focus exists
-    for e in m2:
-        if e not in target_nodes:
-            return False            
-    return True
-        
 def all_subProperties_merged(g, p):
     m1 = [s for s in g.subjects(RDFS.subPropertyOf, p)]
     if len(m1)!= 0:
@@ -412,75 +384,84 @@ def all_subProperties_merged(g, p):
     return True
            
         
-def merge_same_property(g, properties, found_node_targets, same_nodes, target_classes, shapes, target_property, shacl_graph):
+def merge_same_property(g, properties, found_node_targets, same_nodes, target_classes, shapes, target_property, shacl_graph, only=None, shape_index=None):
+    # only: the properties to process (Worklist.dirty_properties), default all
+    # shape_index: the build's ShapeIndex for the sh:path rewrite, made here if not given
+    if shape_index is None:
+        shape_index = ShapeIndex(shacl_graph, (), target_property)
     for focus_property in properties:
+        if only is not None and focus_property not in only:
+            continue
 
         while not all_subProperties_merged(g, focus_property):
             #print("Merge subProperties")
-            for sub_p in g.subjects(RDFS.subPropertyOf, focus_property):   
-                if (focus_property, RDFS.subPropertyOf, sub_p) in g: #scm-eqp2
-                    g.add((focus_property, OWL.sameAs, sub_p))
-                else:
-                    for p3 in g.subjects(RDFS.subPropertyOf, sub_p): # RULE scm-spo
-                        if focus_property != p3:
-                            g.add((p3, RDFS.subPropertyOf, focus_property))
+            # the sub-properties found by scm-spo are picked up by the next iteration
+            with rule_pass(g, "scm-spo") as buf:
+                for sub_p in g.subjects(RDFS.subPropertyOf, focus_property):   
+                    if (focus_property, RDFS.subPropertyOf, sub_p) in g: #scm-eqp2
+                        buf.add((focus_property, OWL.sameAs, sub_p))
+                    else:
+                        for p3 in g.subjects(RDFS.subPropertyOf, sub_p): # RULE scm-spo
+                            if focus_property != p3:
+                                buf.add((p3, RDFS.subPropertyOf, focus_property))
+                                
+                        for c in g.objects(focus_property,RDFS.domain): #scm-dom2
+                            buf.add((sub_p, RDFS.domain, c))
                             
-                    for c in g.objects(focus_property,RDFS.domain): #scm-dom2
-                        g.add((sub_p, RDFS.domain, c))
-                        
-                    for c1 in g.objects(focus_property,RDFS.range): #scm-rng2
-                        g.add((sub_p, RDFS.range, c1))
-                        
-                    for x, y in g.subject_objects(sub_p): # prp-spo1
-                        g.add((x, focus_property, y))
-                
-                g.remove((sub_p, RDFS.subPropertyOf, focus_property)) #可能后退一格
+                        for c1 in g.objects(focus_property,RDFS.range): #scm-rng2
+                            buf.add((sub_p, RDFS.range, c1))
+                            
+                        for x, y in g.subject_objects(sub_p): # prp-spo1
+                            buf.add((x, focus_property, y))
+                    
+                    buf.remove((sub_p, RDFS.subPropertyOf, focus_property)) #可能后退一格
             
         
         while not all_property_merged(g, focus_property):
             #print(focus_property)
-            g.remove((focus_property, OWL.sameAs, focus_property))
-            
-            for p1 in g.subjects(OWL.equivalentProperty, focus_property):
-                g.remove((p1, OWL.equivalentProperty, focus_property))
-                g.add((focus_property, OWL.sameAs, p1))
-            for p2 in g.objects(focus_property, OWL.equivalentProperty):
-                g.remove((focus_property, OWL.equivalentProperty, p2))
-                g.add((focus_property, OWL.sameAs, p2))
-            
-            for same_prop in g.subjects(OWL.sameAs, focus_property):                 
-                g.remove((same_prop, OWL.sameAs, focus_property))
-                g.add((focus_property, OWL.sameAs, same_prop))
+            with rule_pass(g, "eq-prop") as buf:
+                buf.remove((focus_property, OWL.sameAs, focus_property))
                 
-            for same_property in g.objects(focus_property, OWL.sameAs):
+                for p1 in g.subjects(OWL.equivalentProperty, focus_property):
+                    buf.remove((p1, OWL.equivalentProperty, focus_property))
+                    buf.add((focus_property, OWL.sameAs, p1))
+                for p2 in g.objects(focus_property, OWL.equivalentProperty):
+                    buf.remove((focus_property, OWL.equivalentProperty, p2))
+                    buf.add((focus_property, OWL.sameAs, p2))
+                
+                for same_prop in g.subjects(OWL.sameAs, focus_property):                 
+                    buf.remove((same_prop, OWL.sameAs, focus_property))
+                    buf.add((focus_property, OWL.sameAs, same_prop))
+                
+            # links moved onto focus_property below are picked up by the next iteration
+            for same_property in list(g.objects(focus_property, OWL.sameAs)):
                 #check_irreflexiveProperty(g, same_property)
                 #check_asymmetricProperty(g, same_property)
-                g.remove((same_property, OWL.sameAs, same_property))
+                with rule_pass(g, "eq-prop") as buf:
+                    buf.remove((same_property, OWL.sameAs, same_property))
                 
                 if same_property != focus_property:
-              
-                    for p, o in g.predicate_objects(same_property):
-                        g.remove((same_property, p, o))
-                        g.add((focus_property, p, o))
-                    for s, p in g.subject_predicates(same_property):
-                        g.remove((s, p, same_property))
-                        g.add((s, p, focus_property))
-                    for s, o in g.subject_objects(same_property):
-                        g.add((s, focus_property, o))
-                        g.remove((s, same_property, o))
+                    # one pass per position: subject, object, then predicate,
+                    # each one reads the triples the previous one moved
+                    with rule_pass(g, "eq-rep-s") as buf:
+                        for p, o in g.predicate_objects(same_property):
+                            buf.remove((same_property, p, o))
+                            buf.add((focus_property, p, o))
+                    with rule_pass(g, "eq-rep-o") as buf:
+                        for s, p in g.subject_predicates(same_property):
+                            buf.remove((s, p, same_property))
+                            buf.add((s, p, focus_property))
+                    with rule_pass(g, "eq-rep-p") as buf:
+                        for s, o in g.subject_objects(same_property):
+                            buf.add((s, focus_property, o))
+                            buf.remove((s, same_property, o))
                     
                     if same_property in properties:    
                         # properties.remove(same_property) 
-                        for s in shapes:  # Shapes graph re-writing
-                            for blin in target_property:
-                                # if same_property in s.sg.graph.objects(blin, SH_path):
-                                #     s.sg.graph.remove((blin, SH_path, same_property))
-                                #     s.sg.graph.add((blin, SH_path, focus_property))
-                                if same_property in shacl_graph.objects(blin, SH_path):
-                                    shacl_graph.remove((blin, SH_path, same_property))
-                                    shacl_graph.add((blin, SH_path, focus_property))
+                        shape_index.rewrite_path(same_property, focus_property)  # Shapes graph re-writing
                     
-                g.remove((focus_property, OWL.sameAs, same_property))
+                with rule_pass(g, "eq-prop") as buf:
+                    buf.remove((focus_property, OWL.sameAs, same_property))
             
                 
         #check_propertyDisjointWith(g, focus_property)
@@ -495,60 +476,54 @@ def merge_same_property(g, properties, found_node_targets, same_nodes, target_cl
 
 
 
-def merge_same_focus(g, same_nodes, focus,  target_nodes, shapes, shacl_graph):
-    #eq-sym
-    for s in g.subjects(OWL.sameAs, focus): # s = focus node
-        #check_eq_diff_erro(g, s, focus)
-        if s != focus:
-            g.remove((s, OWL.sameAs, focus))
-            g.add((focus, OWL.sameAs, s)) # s = focus --> focus = s
-                 
-    
-    for o in g.objects(focus, OWL.sameAs):   #focus node = o
-        
-        #check_eq_diff_erro(g, focus, o)
-        same_set = same_nodes[focus]
-        same_set.add(o)
-        if o != focus :
-            if o in same_nodes:
-                for i in same_nodes[o]:
-                    same_set.add(i)
-                del same_nodes[o]
-            
-            # for "eq-trans", "eq-rep-s", "eq-rep-o"
-            for pp, oo in g.predicate_objects(o): # o pp oo --> focus pp oo
-                g.remove((o, pp, oo))  
-                g.add((focus, pp, oo))
-            
-            for ss, pp in g.subject_predicates(o): # ss pp o --> ss pp fucus
-                g.remove((ss, pp, o))
-                g.add((ss, pp, focus))
-                    
-            if o in target_nodes :  
-                for s in shapes:  # Shapes graph re-writing
-                    if o in shacl_graph.objects(s.node, SH_targetNode):
-                        shacl_graph.remove((s.node, SH_targetNode, o))
-                        shacl_graph.add((s.node, SH_targetNode, focus))
-            g.remove((focus, OWL.sameAs, o))
-            g.remove((focus, OWL.sameAs, focus))
-        else:
-            g.remove((focus, OWL.sameAs, focus))
-            
-            
-            
 def merged_graph_no_tc(
     data_graph: Union[GraphLike, str, bytes],
     ontology: Graph,
     shacl_graph: Optional[Union[GraphLike, str, bytes]] = None,
     data_graph_format: Optional[str] = None,
-    shacl_graph_format: Optional[str] = None
+    shacl_graph_format: Optional[str] = None,
+    closure_store: Optional[ClosureStore] = None,
+    compact_targets: bool = False,
+    tc_engine: Union[str, Callable[..., Tuple[Graph, Set, Dict]]] = "rdflib",
+    lazy_merge: bool = False,
+    int_store: bool = False,
+    sameas_representative: str = "first",
+    max_sameas_cluster: Optional[int] = None,
     ):
+    """
+    tc_engine: a name from planner.ENGINES ("rdflib", "sparql", "sparse",
+    "parallel") forces that engine, "rdflib" by default. "auto" lets
+    tc_engine.planner pick among the IRI-only engines of
+    planner.AUTO_ENGINES from ontology statistics; its COEFFICIENTS were
+    fitted on a single CPU, so it stays opt-in until they are re-fitted
+    on a multi-core host. Either way the engine name and its predicted cost are
+    reported in timing next to tc_engine_only_ns. Any function with the
+    contract of expand_target_classes_cached
+    (shapes_graph, ontology_graph, seeds, closure_store=...) -> (rewritten, expanded_global, closure_cache)
+    can also be passed directly, bypassing the planner.
+    lazy_merge: merge owl:sameAs individuals in a canonical_view of the data
+    graph (reSHACL.canonical_store) instead of moving their triples; the
+    returned graph is that view.
+    int_store: run the build on a copy of the data graph in an IntegerStore
+    (reSHACL.int_store, terms interned to ints); the returned graph lives
+    in that store and the input graph is left unchanged.
+    sameas_representative, max_sameas_cluster: representative policy and
+    size cap of the owl:sameAs merge (merge_same_focus_all `representative`
+    and `max_cluster`); the cluster statistics are in timing["sameas_clusters"].
+    compact_targets: skip sh:targetClass triples already implied by rdfs:subClassOf
+    in the data graph (see rewrite_shapes_target_classes_from_cache); the
+    shapes graph size before/after is reported in timing.
+    """
     
     shapes, named_graphs, shape_graph = load_graph( data_graph, shacl_graph, data_graph_format,shacl_graph_format)    
 
     shape_g = shape_graph.graph
     
     vg = named_graphs[0]
+    if int_store:
+        vg = integer_graph(vg)
+    if lazy_merge:
+        vg = canonical_view(vg)
     timing: dict[str, int] = {}
     found_node_targets = set()
     target_classes = set()
@@ -561,6 +536,8 @@ def merged_graph_no_tc(
     sh_class = set()
     
     target_nodes=set()
+    # the property shapes of every shape, for the sh:path rewrites
+    property_shapes = set()
     for s in shapes:
         targets = s.target_nodes()
         target_nodes.update(targets)
@@ -571,6 +548,7 @@ def merged_graph_no_tc(
         target_classes.update(s.implicit_class_targets())
             
         target_property=set(s.property_shapes())   
+        property_shapes.update(target_property)
         
         if len(set(s.target_classes()))==0:       
             for blin in target_property:
@@ -590,9 +568,12 @@ def merged_graph_no_tc(
             path_value.update(s.sg.graph.objects(blin, SH_path))
 
    
+    # sub/super/equivalent property closures shared by the whole build
+    prop_closure = PropertyClosure(vg)
+
     fa_p = set()    
     for tp in path_value:
-        vp = vg.transitive_objects(tp, RDFS_subPropertyOf)
+        vp = prop_closure.super_properties(tp)
         for propertis in vp :
             if propertis == tp:
                 continue
@@ -610,56 +591,103 @@ def merged_graph_no_tc(
 
     timing = {}
 
+    if isinstance(tc_engine, str):
+        t_pl0 = time.perf_counter_ns()
+        plan = choose_engine(ontology, target_classes, override=None if tc_engine == "auto" else tc_engine)
+        timing["tc_planner_ns"] = time.perf_counter_ns() - t_pl0
+        timing["tc_engine_name"] = plan.name
+        timing["tc_engine_predicted_ns"] = plan.predicted_ns
+        tc_engine = plan.engine
+
     t_tc0 = time.perf_counter_ns()
-    shape_g, target_classes, _cache = expand_target_classes_cached(shape_g, ontology, target_classes)
+    shape_g, target_classes, _cache = tc_engine(
+        shape_g,
+        ontology,
+        target_classes,
+        closure_store=closure_store,
+        compact_against=vg if compact_targets else None,
+        stats=timing,
+    )
     t_tc1 = time.perf_counter_ns()
 
     timing["tc_engine_only_ns"] = t_tc1 - t_tc0
     timing["tc_engine_only_s"] = (t_tc1 - t_tc0) / 1e9
     timing["tc_engine_target_classes_out"] = len(target_classes)
 
-    target_domain_range(vg, found_node_targets, same_nodes, target_classes)
-    
-    for focus_node in found_node_targets:    
-  
-        while not all_focus_merged(vg, focus_node, found_node_targets):
-       
-            merge_same_focus(vg, same_nodes, focus_node, target_nodes, shapes, shape_g)  
-            #check_com_dw(vg, target_classes)
-    while (not all_samePath_merged(vg, path_value)):
-        target_range(vg, found_node_targets, same_nodes, target_classes)
+    # reverse indexes for the shapes graph rewrites of the merges below
+    shape_index = ShapeIndex(shape_g, [s.node for s in shapes], property_shapes)
+
+    # the loop below re-fires rules only on what changed since their last run
+    work = Worklist(vg, target_classes, path_value, found_node_targets, shape_linked_target, prop_closure)
+    try:
+        target_domain_range(vg, found_node_targets, same_nodes, target_classes, prop_closure)
+    
+        # merge same nodes: owl:sameAs groups around focus nodes, in one pass
+        sameas_stats: dict = {}
+        t_fm0 = time.perf_counter_ns()
+        timing["focus_merged_nodes"] = merge_same_focus_all(
+            vg, same_nodes, found_node_targets, shapes, shape_g,
+            representative=sameas_representative, max_cluster=max_sameas_cluster, stats=sameas_stats,
+            shape_index=shape_index,
+        )
+        timing["focus_merge_ns"] = time.perf_counter_ns() - t_fm0
+        work.focus_merged()
+        # merges rewrite nodes in place, possibly properties
+        prop_closure.invalidate()
+        while work.next_round():
+            target_range(vg, found_node_targets, same_nodes, work.range_classes(), prop_closure)
         
-        # merge same properties 
-        merge_same_property(vg, path_value, found_node_targets, same_nodes, target_classes, shapes, target_property, shape_g)
+            # merge same properties 
+            merge_same_property(vg, path_value, found_node_targets, same_nodes, target_classes, shapes, property_shapes, shape_g, only=work.dirty_properties(), shape_index=shape_index)
+            prop_closure.invalidate()
         
-        # merge same nodes
-        for focus_node in found_node_targets:    
-      
-            while not all_focus_merged(vg, focus_node, found_node_targets):
-          
-                merge_same_focus(vg, same_nodes, focus_node, target_nodes, shapes, shape_g)  
-                #check_com_dw(vg, target_classes)
-
-               
-        for path_ahead in shape_linked_target:
-            for x in vg.objects(None, path_ahead):
-                if x not in found_node_targets:
-                    found_node_targets.add(x)
-                    same_set = set()
-                    same_nodes.update({x: same_set})                          
-    for node in found_node_targets:
-        for p,o in vg.predicate_objects(node):
-            subp = vg.transitive_objects(p,RDFS_subPropertyOf)
-            for subpropertyOf in iter(subp):
-                if subpropertyOf == p:
-                    continue
-                else:
-                    vg.add((node,subpropertyOf,o))
+            # merge same nodes
+            if work.focus_dirty():
+                t_fm0 = time.perf_counter_ns()
+                timing["focus_merged_nodes"] += merge_same_focus_all(
+                    vg, same_nodes, found_node_targets, shapes, shape_g,
+                    representative=sameas_representative, max_cluster=max_sameas_cluster, stats=sameas_stats,
+                    shape_index=shape_index,
+                )
+                timing["focus_merge_ns"] += time.perf_counter_ns() - t_fm0
+                work.focus_merged()
+                prop_closure.invalidate()
+
+            if work.linked_dirty():
+                for path_ahead in shape_linked_target:
+                    for x in vg.objects(None, path_ahead):
+                        if x not in found_node_targets:
+                            found_node_targets.add(x)
+                            same_set = set()
+                            same_nodes.update({x: same_set})
+    finally:
+        work.close()
+    timing["fixpoint_rounds"] = len(work.history)
+    timing["fixpoint_deltas"] = work.history
+    timing["rule_mutations"] = mutation_counts(vg)
+    timing["sameas_clusters"] = sameas_stats
+    timing["shape_rewrites"] = shape_index.rewrites
+    # super-properties of the focus nodes' values, added after the walk
+    with rule_pass(vg, "prp-spo1") as buf:
+        for node in found_node_targets:
+            for p,o in vg.predicate_objects(node):
+                subp = prop_closure.super_properties(p)
+                for subpropertyOf in iter(subp):
+                    if subpropertyOf == p:
+                        continue
+                    else:
+                        buf.add((node,subpropertyOf,o))
             
+    timing["prop_closure_hits"] = prop_closure.hits
+    timing["prop_closure_misses"] = prop_closure.misses
+
     # Add all original triples with property owl:sameAs
     for k in same_nodes:
         for se in same_nodes[k]:
-            vg.add((k, OWL.sameAs, se))
+            if lazy_merge:
+                vg.store.add_verbatim((k, OWL.sameAs, se))
+            else:
+                vg.add((k, OWL.sameAs, se))
             
     # output_shapes = Graph()    # Load the rewrited shapes graph 
     # print("shapes: "+str(type(shapes)))
@@ -670,6 +698,9 @@ def merged_graph_no_tc(
     
     # 'print'("shape_g:",type(shape_g))
         
+    if int_store:
+        timing["int_store_terms"] = len((vg.store.base if lazy_merge else vg).store.terms)
+
     return vg, same_nodes, shape_g, timing # output_shapes
          
 
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, Set
+
+from pyshacl.consts import SH_path, SH_targetNode
+from rdflib import Graph
+from rdflib.term import Node
+
+
+class ShapeIndex:
+    """
+    Reverse indexes of a shapes graph for the rewrites done while merging:
+    `paths` maps a property to the property shape nodes whose sh:path it is,
+    `target_nodes` maps a node to the shape nodes that have it as
+    sh:targetNode. Built once per build; the rewrite methods change the
+    shapes graph and the indexes together, so a merge only touches the
+    shapes it affects. `rewrites` counts the triples rewritten.
+    """
+
+    def __init__(self, shacl_graph: Graph, shape_nodes: Iterable[Node], property_shapes: Iterable[Node]):
+        self.graph = shacl_graph
+        self.paths: Dict[Node, Set[Node]] = {}
+        self.target_nodes: Dict[Node, Set[Node]] = {}
+        self.rewrites = 0
+        for blin in property_shapes:
+            for p in shacl_graph.objects(blin, SH_path):
+                self.paths.setdefault(p, set()).add(blin)
+        for node in shape_nodes:
+            for o in shacl_graph.objects(node, SH_targetNode):
+                self.target_nodes.setdefault(o, set()).add(node)
+
+    def rewrite_path(self, old: Node, new: Node) -> None:
+        """
+        sh:path old -> new on the indexed property shapes.
+        """
+        blins = self.paths.pop(old, None)
+        if not blins:
+            return
+        for blin in blins:
+            self.graph.remove((blin, SH_path, old))
+            self.graph.add((blin, SH_path, new))
+        self.paths.setdefault(new, set()).update(blins)
+        self.rewrites += len(blins)
+
+    def rewrite_target_nodes(self, canon: Dict[Node, Node]) -> None:
+        """
+        sh:targetNode x -> canon[x] on the indexed shapes, for the merged nodes x.
+        """
+        if len(self.target_nodes) < len(canon):
+            merged = [x for x in self.target_nodes if x in canon]
+        else:
+            merged = [x for x in canon if x in self.target_nodes]
+        for x in merged:
+            rep = canon[x]
+            nodes = self.target_nodes.pop(x)
+            for node in nodes:
+                self.graph.remove((node, SH_targetNode, x))
+                self.graph.add((node, SH_targetNode, rep))
+            self.target_nodes.setdefault(rep, set()).update(nodes)
+            self.rewrites += len(nodes)
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import hashlib
+import marshal
+import os
+from array import array
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+from rdflib import Graph, URIRef
+
+from .nt_loader import line_format, local_path, parse_graph
+from .term_table import TermTable, add_encoded, decode_terms
+
+DEFAULT_SNAPSHOT_DIR = ".tc_cache/graphs"
+
+# bumped whenever the layout below changes; marshal.version covers the
+# interpreter side
+SNAPSHOT_VERSION = 1
+
+# formats holding named graphs besides N-Quads (see line_format)
+QUAD_FORMATS = {"trig", "application/trig", "trix", "application/trix"}
+QUAD_SUFFIXES = {".trig", ".trix"}
+
+def file_key(path: Union[str, Path]) -> Tuple[int, int, str]:
+    """
+    (mtime_ns, size, sha256) of a source file: a snapshot is used only
+    while all three still match.
+    """
+    st = os.stat(path)
+    with open(path, "rb") as f:
+        digest = hashlib.file_digest(f, "sha256").hexdigest()
+    return st.st_mtime_ns, st.st_size, digest
+
+
+def is_quad_source(path: Path, rdf_format: Optional[str]) -> bool:
+    """
+    Whether `path` read as `rdf_format` can hold named graphs. A snapshot
+    only keeps the triples of one graph, so these are never snapshotted.
+    """
+    if line_format(path, rdf_format):
+        return True
+    if rdf_format is not None:
+        return rdf_format in QUAD_FORMATS
+    return path.suffix.lower() in QUAD_SUFFIXES
+
+
+def _encode(g: Graph):
+    """
+    The triples of `g` dictionary-encoded: term kinds, term texts, the
+    language or datatype of each literal, and the triples as uint32 IDs.
+    """
+    table = TermTable()
+    intern = table.intern
+    triples = array("I")
+    for s, p, o in g:
+        triples.append(intern(s))
+        triples.append(intern(p))
+        triples.append(intern(o))
+    return bytes(table.kinds), table.texts, table.extras, triples.tobytes()
+
+
+class GraphSnapshots:
+    """
+    Directory of parsed-graph snapshots, one per (source file, format).
+
+    A snapshot is a marshal dump of the dictionary-encoded graph (term
+    table plus a uint32 triple array) and the prefixes the parse bound,
+    headed by the source's file_key. Loading it skips the RDF parser: the
+    terms are rebuilt once each and the triples bulk-added. A changed
+    source (mtime or content) or interpreter (marshal.version) makes the
+    snapshot stale; it is then re-parsed and rewritten.
+
+    `hits` / `misses` count the parse() calls served from / written to a
+    snapshot; `load_stats` is load_lines' stats of the last N-Triples /
+    N-Quads source parsed on a miss.
+    """
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_SNAPSHOT_DIR):
+        self.path = Path(path)
+        self.hits = 0
+        self.misses = 0
+        self.load_stats: dict = {}
+
+    def snapshot_file(self, source: Path, rdf_format: Optional[str]) -> Path:
+        name = hashlib.sha256(f"{source.resolve()}|{rdf_format}".encode("utf-8")).hexdigest()[:24]
+        return self.path / f"{name}.snap"
+
+    def parse(self, graph: Graph, source, format: Optional[str] = None) -> Graph:
+        """
+        graph.parse(source, format=format), through a snapshot when
+        `source` is a local file of a single-graph format (is_quad_source).
+        Returns `graph`.
+        """
+        path = local_path(source)
+        if path is None:
+            graph.parse(source, format=format)
+            return graph
+        if is_quad_source(path, format):
+            return parse_graph(graph, path, format=format, stats=self.load_stats)
+
+        key = file_key(path)
+        snap = self.snapshot_file(path, format)
+        if self._load(snap, key, graph):
+            self.hits += 1
+            return graph
+
+        # parsed on its own so only this source's triples are snapshotted,
+        # then loaded back: a miss fills `graph` in the same triple order
+        # as every later hit, and orders leak into set iteration downstream
+        parsed = Graph()
+        parse_graph(parsed, path, format=format, stats=self.load_stats)
+        self._save(snap, key, parsed)
+        del parsed
+        if not self._load(snap, key, graph):
+            raise RuntimeError(f"snapshot {snap} of {path} could not be read back")
+        self.misses += 1
+        return graph
+
+    def _save(self, snap: Path, key: Tuple[int, int, str], g: Graph) -> None:
+        kinds, texts, extras, triples = _encode(g)
+        namespaces = [(prefix, str(namespace)) for prefix, namespace in g.namespaces()]
+        snap.parent.mkdir(parents=True, exist_ok=True)
+        tmp = snap.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            marshal.dump((SNAPSHOT_VERSION, marshal.version, key), f)
+            marshal.dump((namespaces, kinds, texts, extras, triples), f)
+        os.replace(tmp, snap)  # readers never see a half-written snapshot
+
+    def _load(self, snap: Path, key: Tuple[int, int, str], graph: Graph) -> bool:
+        try:
+            with open(snap, "rb") as f:
+                header = marshal.load(f)
+                if header != (SNAPSHOT_VERSION, marshal.version, key):
+                    return False
+                namespaces, kinds, texts, extras, triples = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return False
+
+        terms = decode_terms(kinds, texts, extras)
+        ids = array("I")
+        ids.frombytes(triples)
+        for prefix, namespace in namespaces:
+            graph.bind(prefix, URIRef(namespace))
+
+        add_encoded(graph, terms, ids)
+        return True
+
+
+# shared by the builders' load_graph; quad sources bypass it there, so
+# load_from_source keeps their named graphs
+SNAPSHOTS = GraphSnapshots()
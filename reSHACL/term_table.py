@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+from array import array
+from typing import List, Optional
+
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.term import Node
+
+from .int_store import IntegerStore
+
+# term kinds
+_URI, _BNODE, _PLAIN, _LANG, _TYPED = range(5)
+
+
+class TermTable:
+    """
+    Dictionary encoding of rdflib terms: `intern` numbers each term once
+    and records its kind, text and the language or datatype of a literal.
+    The three lists are plain str/bytes, cheap to marshal or pickle.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.kinds = bytearray()
+        self.texts: List[str] = []
+        self.extras: List[Optional[str]] = []
+
+    def intern(self, term: Node) -> int:
+        i = self.ids.get(term)
+        if i is None:
+            i = self.ids[term] = len(self.texts)
+            extra = None
+            if isinstance(term, Literal):
+                if term.language is not None:
+                    kind, extra = _LANG, term.language
+                elif term.datatype is not None:
+                    kind, extra = _TYPED, str(term.datatype)
+                else:
+                    kind = _PLAIN
+            elif isinstance(term, BNode):
+                kind = _BNODE
+            else:
+                kind = _URI
+            self.kinds.append(kind)
+            self.texts.append(str(term))
+            self.extras.append(extra)
+        return i
+
+
+def decode_terms(kinds: bytes, texts: List[str], extras: List[Optional[str]], bnodes: Optional[dict] = None) -> List[Node]:
+    """
+    The terms of a TermTable. A blank node gets a fresh label, the same for
+    every occurrence of its text in `bnodes` (one call's own dict if not
+    given), as a re-parse would give.
+    """
+    if bnodes is None:
+        bnodes = {}
+    terms: List[Node] = []
+    append = terms.append
+    for kind, text, extra in zip(kinds, texts, extras):
+        if kind == _URI:
+            append(URIRef(text))
+        elif kind == _BNODE:
+            b = bnodes.get(text)
+            if b is None:
+                b = bnodes[text] = BNode()
+            append(b)
+        elif kind == _PLAIN:
+            append(Literal(text))
+        elif kind == _LANG:
+            append(Literal(text, lang=extra))
+        else:
+            append(Literal(text, datatype=URIRef(extra)))
+    return terms
+
+
+def add_encoded(graph: Graph, terms: List[Node], ids: array) -> None:
+    """
+    Bulk-adds the triples `ids` (flat s, p, o indexes into `terms`) to
+    `graph`, straight to its store.
+    """
+    store = graph.store
+    it = iter(ids)
+    if isinstance(store, IntegerStore):
+        # table IDs -> store IDs, no term is hashed twice
+        remap = [store.intern(t) for t in terms]
+        insert = store.insert
+        for s, p, o in zip(it, it, it):
+            insert(remap[s], remap[p], remap[o])
+    else:
+        # the terms are already valid nodes, Graph.add would only re-check them
+        add = store.add
+        for s, p, o in zip(it, it, it):
+            add((terms[s], terms[p], terms[o]), graph, False)
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from typing import Dict, List, Set
+
+from rdflib import Graph
+from rdflib.term import Node
+
+from tc_engine.scc import strongly_connected_components
+
+
+def materialize_transitive(g: Graph, p: Node) -> int:
+    """
+    Adds the transitive closure of property `p` to `g` (rule prp-trp): an
+    `s p t` triple for every t reachable from s over one or more p edges,
+    so `s p s` only for s on a cycle.
+
+    The p edges are read once; the closure is computed per strongly
+    connected component, in topological order (successors first), and
+    only the missing triples are written, in one addN.
+
+    Returns the number of triples added.
+    """
+    nodes: List[Node] = []
+    ids: Dict[Node, int] = {}
+    succ: List[List[int]] = []
+
+    def intern(u: Node) -> int:
+        i = ids.get(u)
+        if i is None:
+            i = ids[u] = len(nodes)
+            nodes.append(u)
+            succ.append([])
+        return i
+
+    edges: Set[tuple] = set()
+    for s, o in g.subject_objects(p):
+        e = (intern(s), intern(o))
+        edges.add(e)
+        succ[e[0]].append(e[1])
+    if not edges:
+        return 0
+
+    comp_of, comps = strongly_connected_components(succ)
+
+    # reach[k]: nodes reachable in one or more steps from the members of component k;
+    # Tarjan numbers the successors of a component before it
+    reach: List[Set[int]] = []
+    for k, members in enumerate(comps):
+        out: Set[int] = set()
+        cyclic = len(members) > 1
+        for v in members:
+            for w in succ[v]:
+                c = comp_of[w]
+                if c == k:
+                    cyclic = True
+                else:
+                    out.add(w)
+                    out |= reach[c]
+        if cyclic:
+            out.update(members)
+        reach.append(out)
+
+    missing = [
+        (nodes[v], p, nodes[w], g)
+        for v in range(len(nodes)) if succ[v]
+        for w in reach[comp_of[v]]
+        if (v, w) not in edges
+    ]
+    g.addN(missing)
+    return len(missing)
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+from typing import Dict, Hashable, List, Optional, Set
+
+from rdflib import Graph
+from rdflib.namespace import OWL, RDF
+from rdflib.term import Node
+
+from .canonical_store import CanonicalStore
+from .shape_index import ShapeIndex
+
+
+class UnionFind:
+    """
+    Disjoint sets over hashable items, with path compression and union by size.
+    """
+
+    def __init__(self):
+        self.parent: Dict[Hashable, Hashable] = {}
+        self.size: Dict[Hashable, int] = {}
+
+    def __contains__(self, x: Hashable) -> bool:
+        return x in self.parent
+
+    def find(self, x: Hashable) -> Hashable:
+        parent = self.parent
+        if x not in parent:
+            parent[x] = x
+            self.size[x] = 1
+            return x
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a: Hashable, b: Hashable) -> Hashable:
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return ra
+        if self.size[ra] < self.size[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.size[ra] += self.size.pop(rb)
+        return ra
+
+    def groups(self) -> Dict[Hashable, List[Hashable]]:
+        out: Dict[Hashable, List[Hashable]] = {}
+        for x in self.parent:
+            out.setdefault(self.find(x), []).append(x)
+        return out
+
+
+# how merge_same_focus_all picks the representative of a group
+REPRESENTATIVES = ("first", "degree", "target")
+
+
+def _degree(g: Graph, x: Node) -> int:
+    # triples that would have to move if x were merged away; the
+    # owl:sameAs links inside a group are dropped, not moved
+    return (
+        sum(1 for _, p, _ in g.triples((x, None, None)) if p != OWL.sameAs)
+        + sum(1 for _, p, _ in g.triples((None, None, x)) if p != OWL.sameAs)
+    )
+
+
+def _target_score(g: Graph, x: Node, target_nodes: Set[Node], target_classes: Set[Node]) -> int:
+    # number of shape targets x is in: sh:targetNode, plus its types among the target classes
+    return (x in target_nodes) + sum(1 for c in g.objects(x, RDF.type) if c in target_classes)
+
+
+def merge_same_focus_all(
+    g: Graph,
+    same_nodes: dict,
+    focus_nodes: Set[Node],
+    shapes,
+    shacl_graph: Graph,
+    representative: str = "first",
+    max_cluster: Optional[int] = None,
+    stats: Optional[dict] = None,
+    shape_index: Optional[ShapeIndex] = None,
+) -> int:
+    """
+    Merges the owl:sameAs clusters of all focus nodes in one pass
+    (rules eq-sym, eq-trans, eq-rep-s, eq-rep-o):
+
+      - groups the nodes connected by owl:sameAs (either direction) with a union-find,
+      - keeps the groups that contain a focus node; the representative is the
+        focus node the former per-node sweep kept: the first one in
+        `focus_nodes` order still linked by owl:sameAs (it is the subject of
+        an owl:sameAs, or the object of one from a non-focus node),
+      - moves every triple of the other members onto the representative in one
+        pass and drops the owl:sameAs triples inside the group (on a
+        canonical_view only the mapping is recorded, nothing is moved),
+      - records the members in same_nodes[representative] (absorbing their own
+        same_nodes entries) and rewrites sh:targetNode to the representative.
+
+    representative: "first" is the choice above; "degree" takes the
+    focus node of the group with the most triples, so the fewest move;
+    "target" the one in the most shape targets (sh:targetNode, types among
+    the target classes), then by degree. Ties go to the first in
+    `focus_nodes` order.
+    max_cluster: groups with more members are left unmerged, their
+    owl:sameAs triples kept, and reported in stats["capped"].
+    stats: accumulates over calls: "clusters" merged, "members" merged
+    away, "largest" group, "sizes" {size: count} and "capped"
+    {first focus node: size}.
+    shape_index: the build's ShapeIndex for the sh:targetNode rewrite; one
+    is made from `shapes` if not given.
+
+    Returns the number of nodes merged away.
+    """
+    if representative not in REPRESENTATIVES:
+        raise ValueError(f"Unknown representative policy {representative!r}, expected one of {REPRESENTATIVES}")
+    uf = UnionFind()
+    loops: Set[Node] = set()
+    unmerged: Set[Node] = set()
+    for s, o in g.subject_objects(OWL.sameAs):
+        if s == o:
+            loops.add(s)
+        unmerged.add(s)
+        if s not in focus_nodes:
+            unmerged.add(o)
+        uf.union(s, o)
+    if not uf.parent:
+        return 0
+
+    rep_of: Dict[Hashable, Node] = {}
+    for f in focus_nodes:
+        if f in unmerged:
+            rep_of.setdefault(uf.find(f), f)
+
+    if representative != "first" or max_cluster is not None:
+        candidates: Dict[Hashable, List[Node]] = {}  # root -> its focus nodes, in order
+        for f in focus_nodes:
+            if f in uf:
+                candidates.setdefault(uf.find(f), []).append(f)
+        if representative == "target":
+            target_nodes: Set[Node] = set()
+            target_classes: Set[Node] = set()
+            for s in shapes:
+                target_nodes.update(s.target_nodes())
+                target_classes.update(s.target_classes())
+                target_classes.update(s.implicit_class_targets())
+        for root in list(rep_of):
+            if max_cluster is not None and uf.size[root] > max_cluster:
+                del rep_of[root]
+                if stats is not None:
+                    stats.setdefault("capped", {})[str(candidates[root][0])] = uf.size[root]
+            elif representative == "degree":
+                rep_of[root] = max(candidates[root], key=lambda x: _degree(g, x))
+            elif representative == "target":
+                rep_of[root] = max(
+                    candidates[root],
+                    key=lambda x: (_target_score(g, x, target_nodes, target_classes), _degree(g, x)),
+                )
+
+    canon: Dict[Node, Node] = {}
+    for x in list(uf.parent):
+        rep = rep_of.get(uf.find(x))
+        if rep is not None and x != rep:
+            canon[x] = rep
+
+    if stats is not None:
+        sizes = stats.setdefault("sizes", {})
+        for root in rep_of:
+            sizes[uf.size[root]] = sizes.get(uf.size[root], 0) + 1
+            stats["largest"] = max(stats.get("largest", 0), uf.size[root])
+        stats["clusters"] = stats.get("clusters", 0) + len(rep_of)
+        stats["members"] = stats.get("members", 0) + len(canon)
+
+    # same_nodes[rep] collects every member merged into it
+    for x, rep in canon.items():
+        same_set = same_nodes.setdefault(rep, set())
+        same_set.add(x)
+        if x in same_nodes:
+            same_set.update(same_nodes.pop(x))
+    for rep in rep_of.values():
+        if rep in loops:
+            same_nodes.setdefault(rep, set()).add(rep)
+
+    if isinstance(g.store, CanonicalStore):
+        g.store.merge(canon)
+        # loops on a representative that were there before the merge
+        for rep in loops & set(rep_of.values()):
+            g.remove((rep, OWL.sameAs, rep))
+    else:
+        # one pass over the triples touching a merged member (as subject or object)
+        moved = set()
+        for x in canon:
+            moved.update(g.triples((x, None, None)))
+            moved.update(g.triples((None, None, x)))
+        for t in moved:
+            g.remove(t)
+        g.addN(
+            (canon.get(s, s), p, canon.get(o, o), g)
+            for s, p, o in moved
+        )
+
+        # owl:sameAs inside a merged group is now a loop on its representative
+        for rep in rep_of.values():
+            g.remove((rep, OWL.sameAs, rep))
+
+    # Shapes graph re-writing
+    if shape_index is None:
+        shape_index = ShapeIndex(shacl_graph, [s.node for s in shapes], ())
+    shape_index.rewrite_target_nodes(canon)
+
+    return len(canon)
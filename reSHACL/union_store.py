@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from itertools import chain
+from typing import Iterator, List, Optional, Sequence, Set, Tuple
+
+from rdflib import Graph
+from rdflib.graph import ModificationException
+from rdflib.plugins.stores.memory import Memory
+from rdflib.store import Store
+from rdflib.term import Node
+
+Triple = Tuple[Node, Node, Node]
+
+
+class UnionStore(Store):
+    """
+    Read-only union of graphs: each triple is read from the first graph
+    that has it, nothing is copied. Lets one parsed ontology back both the
+    ontology graph and data+ontology, with an overlay_graph on top for the
+    writes of a build.
+
+    The graphs must not change while the union is in use: the triples a
+    later graph shares with an earlier one are found once, at
+    construction, and skipped on every read after that.
+    """
+
+    context_aware = True
+    formula_aware = False
+    transaction_aware = False
+    graph_aware = True
+
+    def __init__(self, graphs: Sequence[Graph]):
+        super().__init__()
+        self.graphs = list(graphs)
+        self.local = Memory()  # prefixes only
+        # per graph, its triples an earlier graph already has
+        self.shadowed: List[Set[Triple]] = []
+        for i, g in enumerate(self.graphs):
+            earlier = self.graphs[:i]
+            self.shadowed.append({t for t in g if any(t in e for e in earlier)})
+        self._len = sum(len(g) - len(sh) for g, sh in zip(self.graphs, self.shadowed))
+        # the terms of the graphs after the first (the small ones: put the
+        # data graph first), so a pattern skips those it cannot match
+        self.terms: List[Optional[Tuple[Set[Node], Set[Node], Set[Node]]]] = [None]
+        for g in self.graphs[1:]:
+            self.terms.append((set(g.subjects(unique=True)), set(g.predicates(unique=True)), set(g.objects(unique=True))))
+
+    def triples(self, triple_pattern, context=None) -> Iterator[Tuple[Triple, Iterator]]:
+        # straight to the member stores, Graph.triples has already resolved paths
+        s, p, o = triple_pattern
+        parts = []
+        for g, shadowed, terms in zip(self.graphs, self.shadowed, self.terms):
+            if terms is not None and (
+                (s is not None and s not in terms[0])
+                or (p is not None and p not in terms[1])
+                or (o is not None and o not in terms[2])
+            ):
+                continue
+            found = g.store.triples(triple_pattern, g)
+            parts.append(_unshadowed(found, shadowed) if shadowed else found)
+        # one member left: its own iterator, no extra generator per triple
+        if len(parts) == 1:
+            return parts[0]
+        return chain.from_iterable(parts)
+
+    def __len__(self, context=None) -> int:
+        return self._len
+
+    def add(self, triple: Triple, context=None, quoted: bool = False) -> None:
+        raise ModificationException()
+
+    def addN(self, quads) -> None:
+        raise ModificationException()
+
+    def remove(self, triple_pattern, context=None) -> None:
+        raise ModificationException()
+
+    def contexts(self, triple=None):
+        return iter(())
+
+    def add_graph(self, graph: Graph) -> None:
+        pass
+
+    def remove_graph(self, graph: Graph) -> None:
+        pass
+
+    # prefixes bound on the union stay local; after those, the first
+    # graph binding a prefix (or namespace) wins
+    def bind(self, prefix, namespace, override: bool = True) -> None:
+        self.local.bind(prefix, namespace, override=override)
+
+    def prefix(self, namespace) -> Optional[str]:
+        for store in self._namespace_stores():
+            prefix = store.prefix(namespace)
+            if prefix is not None:
+                return prefix
+        return None
+
+    def namespace(self, prefix):
+        for store in self._namespace_stores():
+            namespace = store.namespace(prefix)
+            if namespace is not None:
+                return namespace
+        return None
+
+    def namespaces(self):
+        seen = {}
+        bound = set()
+        for store in self._namespace_stores():
+            for prefix, namespace in store.namespaces():
+                if prefix not in seen and namespace not in bound:
+                    seen[prefix] = namespace
+                    bound.add(namespace)
+        return iter(list(seen.items()))
+
+    def _namespace_stores(self) -> Iterator[Store]:
+        yield self.local
+        for g in self.graphs:
+            yield g.store
+
+
+def _unshadowed(found, shadowed: Set[Triple]) -> Iterator[Tuple[Triple, Iterator]]:
+    for t, c in found:
+        if t not in shadowed:
+            yield t, c
+
+
+def union_graph(*graphs: Graph) -> Graph:
+    """
+    A read-only Graph over the union of `graphs`, identified as the first.
+    """
+    return Graph(store=UnionStore(graphs), identifier=graphs[0].identifier)
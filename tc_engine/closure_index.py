@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Iterable
+
+from rdflib import Graph, URIRef
+
+from tc_engine.graph_cache import GraphCache
+from tc_engine.scc import Condensation
+
+if TYPE_CHECKING:
+    from tc_engine.disk_cache import ClosureStore
+
+
+class ClosureIndex:
+    """
+    Precomputed class closures for every class of an ontology.
+
+    Classes are interned to integer IDs and the closure of each class
+    (same edges as engine_rdflib.class_closure) is stored as a bitset,
+    i.e. a Python int where bit i is set when class i is reachable.
+    Expanding a set of seeds is then a lookup and a bitwise union.
+    """
+
+    def __init__(self, classes: list[URIRef], closures: list[int]):
+        self.classes = classes
+        self.ids: dict[URIRef, int] = {c: i for i, c in enumerate(classes)}
+        self.closures = closures
+
+    @classmethod
+    def build(cls, ont: Graph) -> "ClosureIndex":
+        """
+        Closures are computed once per strongly connected component of the
+        class graph (see tc_engine.scc) and shared by all of its members.
+        """
+        cond = Condensation.build(ont, iri_only=True)
+        return cls(cond.nodes, cond.closure_bits())
+
+    def __len__(self) -> int:
+        return len(self.classes)
+
+    def __contains__(self, c: URIRef) -> bool:
+        return c in self.ids
+
+    def decode(self, bits: int) -> set[URIRef]:
+        out: set[URIRef] = set()
+        while bits:
+            low = bits & -bits
+            out.add(self.classes[low.bit_length() - 1])
+            bits ^= low
+        return out
+
+    def closure_bits(self, c: URIRef) -> int:
+        i = self.ids.get(c)
+        return 0 if i is None else self.closures[i]
+
+    def closure(self, c: URIRef) -> set[URIRef]:
+        """
+        Same result as engine_rdflib.class_closure(ont, c): always includes `c`.
+        """
+        bits = self.closure_bits(c)
+        return self.decode(bits) if bits else {c}
+
+    def expand(
+        self,
+        seeds: Iterable[URIRef],
+    ) -> tuple[dict[URIRef, set[URIRef]], set[URIRef]]:
+        """
+        Returns (closure_cache, expanded_global) for the given seeds.
+        """
+        closure_cache: dict[URIRef, set[URIRef]] = {}
+        union_bits = 0
+        unknown: set[URIRef] = set()
+        for c in seeds:
+            if not isinstance(c, URIRef) or c in closure_cache:
+                continue
+            bits = self.closure_bits(c)
+            if bits:
+                closure_cache[c] = self.decode(bits)
+                union_bits |= bits
+            else:
+                closure_cache[c] = {c}
+                unknown.add(c)
+        expanded_global = self.decode(union_bits)
+        expanded_global.update(unknown)
+        return closure_cache, expanded_global
+
+
+# One index per ontology Graph object, see GraphCache for when it is rebuilt.
+_INDEX_CACHE = GraphCache()
+
+
+def has_closure_index(ont: Graph) -> bool:
+    """
+    Whether the ClosureIndex of `ont` is built and still valid.
+    """
+    return _INDEX_CACHE.has(ont)
+
+
+def get_closure_index(ont: Graph, store: ClosureStore | None = None) -> ClosureIndex:
+    """
+    Returns the ClosureIndex of `ont`, building it on first use.
+    With a ClosureStore, a cold process loads the index from disk instead
+    of building it (and saves it after building on a cache miss).
+    """
+    index = _INDEX_CACHE.get(ont)
+    if index is not None:
+        return index
+
+    if store is None:
+        index = ClosureIndex.build(ont)
+    else:
+        index = store.load_index(ont)
+        if index is None:
+            index = ClosureIndex.build(ont)
+            store.save_index(ont, index)
+    _INDEX_CACHE.put(ont, index)
+    return index
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterable
+
+from rdflib import BNode, Graph, URIRef
+from rdflib.compare import to_canonical_graph
+from rdflib.namespace import OWL, RDFS
+
+from tc_engine.closure_index import ClosureIndex
+
+# Only these triples can change a class closure.
+CLOSURE_PREDICATES = (RDFS.subClassOf, OWL.equivalentClass, OWL.sameAs)
+
+DEFAULT_CACHE_PATH = ".tc_cache/closures.sqlite"
+
+# ontologies whose closures are kept, e.g. a full ontology and its modules
+DEFAULT_MAX_FINGERPRINTS = 8
+
+
+def ontology_fingerprint(ont: Graph) -> str:
+    """
+    sha256 over the sorted N-Triples of every subClassOf / equivalentClass / sameAs
+    triple of `ont`. Blank-node labels change with every parse (and snapshot
+    load), so the triples holding a blank node are hashed in rdflib's canonical
+    labelling instead.
+
+    Not memoised: an in-place edit of `ont` that keeps its size must not
+    leave closures filed under the old ontology's key.
+    """
+    lines: list[str] = []
+    with_bnodes = Graph()
+    for p in CLOSURE_PREDICATES:
+        for s, _, o in ont.triples((None, p, None)):
+            if isinstance(s, BNode) or isinstance(o, BNode):
+                with_bnodes.add((s, p, o))
+            else:
+                lines.append(f"{s.n3()} {p.n3()} {o.n3()} .")
+    if len(with_bnodes):
+        lines.extend(to_canonical_graph(with_bnodes).serialize(format="nt").splitlines())
+    lines.sort()
+
+    h = hashlib.sha256()
+    for line in lines:
+        if not line:
+            continue
+        h.update(line.encode("utf-8"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+class ClosureStore:
+    """
+    SQLite cache of class closures, keyed by ontology_fingerprint. Every
+    load and save takes the ontology and fingerprints it as it is then.
+
+    Three tables:
+      - closure_index: a whole ClosureIndex (one row per interned class, bitset as BLOB)
+      - seed_closure:  per-seed closures, keyed by the engine that computed them
+                       (engines disagree on blank-node classes: SPARQL follows
+                       subClassOf through them, the IRI-only engines stop)
+      - fingerprint:   when each fingerprint was last read or written
+
+    A changed ontology simply gets a new fingerprint. Closures of up to
+    `max_fingerprints` ontologies are kept; a write evicts the least
+    recently used beyond that.
+    """
+
+    def __init__(self, path: str | Path = DEFAULT_CACHE_PATH, max_fingerprints: int = DEFAULT_MAX_FINGERPRINTS):
+        self.path = Path(path)
+        self.max_fingerprints = max_fingerprints
+        self._conn: sqlite3.Connection | None = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path))
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(seed_closure)")]
+            if columns and "engine" not in columns:
+                # written before closures were keyed by engine: not attributable
+                self._conn.execute("DROP TABLE seed_closure")
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS closure_index (
+                    fingerprint TEXT NOT NULL,
+                    id          INTEGER NOT NULL,
+                    cls         TEXT NOT NULL,
+                    bits        BLOB NOT NULL,
+                    PRIMARY KEY (fingerprint, id)
+                );
+                CREATE TABLE IF NOT EXISTS seed_closure (
+                    fingerprint TEXT NOT NULL,
+                    engine      TEXT NOT NULL,
+                    seed        TEXT NOT NULL,
+                    members     TEXT NOT NULL,
+                    PRIMARY KEY (fingerprint, engine, seed)
+                );
+                CREATE TABLE IF NOT EXISTS fingerprint (
+                    fingerprint TEXT PRIMARY KEY,
+                    last_used   INTEGER NOT NULL
+                );
+                """
+            )
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _touch(self, fingerprint: str) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO fingerprint (fingerprint, last_used) VALUES (?, ?)",
+            (fingerprint, time.time_ns()),
+        )
+
+    def _evict(self) -> None:
+        """
+        Drops the rows of every fingerprint but the max_fingerprints most
+        recently used (rows with no fingerprint entry go too).
+        """
+        keep = [
+            row[0] for row in self.conn.execute(
+                "SELECT fingerprint FROM fingerprint ORDER BY last_used DESC LIMIT ?",
+                (self.max_fingerprints,),
+            )
+        ]
+        marks = ", ".join("?" * len(keep))
+        for table in ("closure_index", "seed_closure", "fingerprint"):
+            self.conn.execute(f"DELETE FROM {table} WHERE fingerprint NOT IN ({marks})", keep)
+
+    # ----------------------------
+    # Whole index
+    # ----------------------------
+    def load_index(self, ont: Graph) -> ClosureIndex | None:
+        fingerprint = ontology_fingerprint(ont)
+        rows = self.conn.execute(
+            "SELECT cls, bits FROM closure_index WHERE fingerprint = ? ORDER BY id",
+            (fingerprint,),
+        ).fetchall()
+        if not rows:
+            return None
+        with self.conn:
+            self._touch(fingerprint)
+        classes = [URIRef(cls) for cls, _ in rows]
+        closures = [int.from_bytes(bits, "little") for _, bits in rows]
+        return ClosureIndex(classes, closures)
+
+    def save_index(self, ont: Graph, index: ClosureIndex) -> None:
+        fingerprint = ontology_fingerprint(ont)
+        with self.conn:
+            self.conn.execute("DELETE FROM closure_index WHERE fingerprint = ?", (fingerprint,))
+            self.conn.executemany(
+                "INSERT INTO closure_index (fingerprint, id, cls, bits) VALUES (?, ?, ?, ?)",
+                (
+                    (fingerprint, i, str(c), bits.to_bytes((bits.bit_length() + 7) // 8, "little"))
+                    for i, (c, bits) in enumerate(zip(index.classes, index.closures))
+                ),
+            )
+            self._touch(fingerprint)
+            self._evict()
+
+    # ----------------------------
+    # Per-seed closures
+    # ----------------------------
+    def load_closures(
+        self,
+        ont: Graph,
+        engine: str,
+        seeds: Iterable[URIRef],
+    ) -> dict[URIRef, set[URIRef]]:
+        fingerprint = ontology_fingerprint(ont)
+        out: dict[URIRef, set[URIRef]] = {}
+        cur = self.conn.cursor()
+        for seed in seeds:
+            row = cur.execute(
+                "SELECT members FROM seed_closure WHERE fingerprint = ? AND engine = ? AND seed = ?",
+                (fingerprint, engine, str(seed)),
+            ).fetchone()
+            if row is not None:
+                out[seed] = {URIRef(m) for m in row[0].split("\n")}
+        if out:
+            with self.conn:
+                self._touch(fingerprint)
+        return out
+
+    def save_closures(
+        self,
+        ont: Graph,
+        engine: str,
+        closure_cache: dict[URIRef, set[URIRef]],
+    ) -> None:
+        fingerprint = ontology_fingerprint(ont)
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO seed_closure (fingerprint, engine, seed, members) VALUES (?, ?, ?, ?)",
+                (
+                    (fingerprint, engine, str(seed), "\n".join(str(m) for m in members))
+                    for seed, members in closure_cache.items()
+                ),
+            )
+            self._touch(fingerprint)
+            self._evict()
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from rdflib import Graph
+from rdflib.namespace import OWL, RDFS
+from rdflib.term import Node
+
+Triple = tuple[Node, Node, Node]
+
+
+class PropertyClosure:
+    """
+    Cached property-hierarchy closures of a graph under construction:
+
+      - sub_properties(p):   g.transitive_subjects(rdfs:subPropertyOf, p)
+      - super_properties(p): g.transitive_objects(p, rdfs:subPropertyOf)
+      - equivalents(p):      g.transitive_subjects(owl:equivalentProperty, p)
+                             | g.transitive_objects(p, owl:equivalentProperty)
+
+    Each result includes p and is computed once until the hierarchy changes.
+    Code that writes subPropertyOf / equivalentProperty triples must go
+    through add() or call invalidate() afterwards.
+    """
+
+    PREDICATES = (RDFS.subPropertyOf, OWL.equivalentProperty)
+
+    def __init__(self, g: Graph):
+        self.g = g
+        self._sub: dict[Node, frozenset[Node]] = {}
+        self._super: dict[Node, frozenset[Node]] = {}
+        self._equiv: dict[Node, frozenset[Node]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self) -> None:
+        self._sub.clear()
+        self._super.clear()
+        self._equiv.clear()
+
+    def add(self, triple: Triple) -> None:
+        """
+        Adds `triple` to the graph; the cache is only dropped when the triple is new.
+        """
+        if triple in self.g:
+            return
+        self.g.add(triple)
+        if triple[1] in self.PREDICATES:
+            self.invalidate()
+
+    def _walk(self, start: Node, p: Node, up: bool) -> frozenset[Node]:
+        seen = {start}
+        stack = [start]
+        while stack:
+            x = stack.pop()
+            nbrs = self.g.objects(x, p) if up else self.g.subjects(p, x)
+            for y in nbrs:
+                if y not in seen:
+                    seen.add(y)
+                    stack.append(y)
+        return frozenset(seen)
+
+    def _cached(self, cache: dict[Node, frozenset[Node]], p: Node, compute) -> frozenset[Node]:
+        hit = cache.get(p)
+        if hit is not None:
+            self.hits += 1
+            return hit
+        self.misses += 1
+        res = cache[p] = compute(p)
+        return res
+
+    def sub_properties(self, p: Node) -> frozenset[Node]:
+        return self._cached(self._sub, p, lambda x: self._walk(x, RDFS.subPropertyOf, up=False))
+
+    def super_properties(self, p: Node) -> frozenset[Node]:
+        return self._cached(self._super, p, lambda x: self._walk(x, RDFS.subPropertyOf, up=True))
+
+    def equivalents(self, p: Node) -> frozenset[Node]:
+        return self._cached(
+            self._equiv,
+            p,
+            lambda x: self._walk(x, OWL.equivalentProperty, up=False)
+            | self._walk(x, OWL.equivalentProperty, up=True),
+        )
@@ -6,6 +6,9 @@ from rdflib.term import Identifier
 import subprocess
 from pathlib import Path
 
+from tc_engine.closure_index import ClosureIndex, get_closure_index
+from tc_engine.disk_cache import ClosureStore
+
 
 def class_closure(ont: Graph, start: URIRef) -> set[URIRef]:
     """
@@ -42,11 +45,24 @@ def class_closure(ont: Graph, start: URIRef) -> set[URIRef]:
 def rewrite_shapes_target_classes_from_cache(
     shapes_graph: Graph,
     closure_cache: dict[URIRef, set[URIRef]],
+    compact_against: Graph | None = None,
+    stats: dict[str, int] | None = None,
 ) -> Graph:
     """
     For each shape that has sh:targetClass t, add sh:targetClass for every c in closure_cache[t].
+
+    compact_against: the data graph the shapes will be validated on. SHACL
+    targetClass already selects instances of rdfs:subClassOf* subclasses
+    (in the data graph), so a closure member that is a subclass of another
+    target of the same shape there is not emitted. Focus nodes stay the same
+    as long as that graph keeps its subClassOf triples until validation.
+    Existing sh:targetClass triples are never removed.
+
+    stats: filled with the shapes graph size before/after and the number of
+    sh:targetClass triples added/skipped.
     """
     SH = Namespace("http://www.w3.org/ns/shacl#")
+    before = len(shapes_graph)
 
     #Collect per-shape targets (only explicit sh:targetClass)
     shape_target_map: dict[Identifier, set[URIRef]] = {}
@@ -54,36 +70,72 @@ def rewrite_shapes_target_classes_from_cache(
         if isinstance(cls, URIRef):
             shape_target_map.setdefault(shape, set()).add(cls)
 
+    #Superclasses in the data graph, shared across shapes
+    ancestors: dict[URIRef, set[URIRef]] = {}
+
+    def supers(c: URIRef) -> set[URIRef]:
+        a = ancestors.get(c)
+        if a is None:
+            a = set(compact_against.transitive_objects(c, RDFS.subClassOf))
+            a.discard(c)
+            ancestors[c] = a
+        return a
+
+    def covered(c: URIRef, members: set[URIRef]) -> bool:
+        # c is redundant if another member is a superclass of it; within a
+        # subClassOf cycle only the smallest IRI is kept
+        for a in supers(c) & members:
+            if c not in supers(a) or str(a) < str(c):
+                return True
+        return False
+
     #Add closure classes per shape
+    added = skipped = 0
     for shape, targets in shape_target_map.items():
+        members: set[URIRef] = set(targets)
         for t in targets:
-            cc = closure_cache.get(t)
-            if not cc:
+            members.update(closure_cache.get(t) or ())
+        for c in members - targets:
+            if compact_against is not None and covered(c, members):
+                skipped += 1
                 continue
-            for c in cc:
-                shapes_graph.add((shape, SH.targetClass, c))
+            shapes_graph.add((shape, SH.targetClass, c))
+            added += 1
+
+    if stats is not None:
+        stats["tc_shapes_triples_before"] = before
+        stats["tc_shapes_triples_after"] = len(shapes_graph)
+        stats["tc_target_triples_added"] = added
+        stats["tc_target_triples_skipped"] = skipped
     return shapes_graph
 
 def expand_target_classes_cached(
     shapes_graph: Graph,
     ontology_graph: Graph,
     seed_target_classes: set[URIRef],
+    index: ClosureIndex | None = None,
+    closure_store: ClosureStore | None = None,
+    compact_against: Graph | None = None,
+    stats: dict[str, int] | None = None,
 ) -> tuple[Graph, set[URIRef], dict[URIRef, set[URIRef]]]:
-    SH = Namespace("http://www.w3.org/ns/shacl#")
-    # Build cache
-    closure_cache: dict[URIRef, set[URIRef]] = {}
-    expanded_global: set[URIRef] = set()
+    """
+    Looks up the closure of every seed in the ontology's ClosureIndex
+    (built once per ontology graph, see get_closure_index) and rewrites the shapes.
+    With a closure_store the index survives across processes.
+    compact_against / stats: see rewrite_shapes_target_classes_from_cache.
+    """
+    if index is None:
+        index = get_closure_index(ontology_graph, closure_store)
 
-    for c in seed_target_classes:
-        if isinstance(c, URIRef) and c not in closure_cache:
-            cc = class_closure(ontology_graph, c)
-            closure_cache[c] = cc
-            expanded_global.update(cc)
+    # Build cache
+    closure_cache, expanded_global = index.expand(seed_target_classes)
 
     #Rewrite shapes using the cache
     rewritten = rewrite_shapes_target_classes_from_cache(
         shapes_graph,
         closure_cache,
+        compact_against=compact_against,
+        stats=stats,
     )
 
     return rewritten, expanded_global, closure_cache
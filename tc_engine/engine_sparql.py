@@ -3,38 +3,14 @@ from __future__ import annotations
 from typing import Iterable
 from rdflib import Graph, Namespace, URIRef
 from rdflib.namespace import RDF
-from rdflib.term import Identifier
+from rdflib.term import Node
+from rdflib.paths import AlternativePath, InvPath, MulPath, ZeroOrMore
 from rdflib.plugins.sparql import prepareQuery
+from rdflib.plugins.sparql.parserutils import CompValue
 
-
-# ----------------------------
-# Rewrite
-# ----------------------------
-def rewrite_shapes_target_classes_from_cache(
-    shapes_graph: Graph,
-    closure_cache: dict[URIRef, set[URIRef]]
-) -> Graph:
-    """
-    For each shape that has sh:targetClass t, add sh:targetClass for every c in closure_cache[t].
-    """
-    SH = Namespace("http://www.w3.org/ns/shacl#")
-
-    # Collect per-shape targets (only explicit sh:targetClass)
-    shape_target_map: dict[Identifier, set[URIRef]] = {}
-    for shape, _, cls in shapes_graph.triples((None, SH.targetClass, None)):
-        if isinstance(cls, URIRef):
-            shape_target_map.setdefault(shape, set()).add(cls)
-
-    # Add closure classes per shape
-    for shape, targets in shape_target_map.items():
-        for t in targets:
-            cc = closure_cache.get(t)
-            if not cc:
-                continue
-            for c in cc:
-                shapes_graph.add((shape, SH.targetClass, c))
-
-    return shapes_graph
+from tc_engine.disk_cache import ClosureStore
+from tc_engine.engine_rdflib import rewrite_shapes_target_classes_from_cache
+from tc_engine.scc import get_condensation
 
 
 # ----------------------------
@@ -59,25 +35,168 @@ SELECT DISTINCT ?seed ?c WHERE {
 def _values_block_uris(seeds: Iterable[URIRef]) -> str:
     return " ".join(f"<{str(s)}>" for s in seeds if isinstance(s, URIRef))
 
-def closure_cache_sparql_all(ont: Graph, seeds: set[URIRef]) -> dict[URIRef, set[URIRef]]:
+
+# ----------------------------
+# Native evaluation of the alternative-path-star query
+# ----------------------------
+class StarPathPlan:
+    """
+    Compiled form of `?seed (p1 | ^p2 | ...)* ?c`: the alternative steps as
+    (predicate, inverse) pairs, evaluated directly on the graph's triple
+    indexes with one visited set per seed instead of rdflib's path algebra.
+    """
+
+    def __init__(self, steps: list[tuple[URIRef, bool]], iri_only: bool):
+        self.steps = steps
+        self.iri_only = iri_only
+
+    def evaluate(self, graph: Graph, seeds: Iterable[Node]) -> dict[Node, set[Node]]:
+        out: dict[Node, set[Node]] = {}
+        for seed in seeds:
+            visited: set[Node] = {seed}
+            stack: list[Node] = [seed]
+            while stack:
+                x = stack.pop()
+                for p, inverse in self.steps:
+                    nbrs = graph.subjects(p, x) if inverse else graph.objects(x, p)
+                    for y in nbrs:
+                        if y not in visited:
+                            visited.add(y)
+                            stack.append(y)
+            if self.iri_only:
+                visited = {y for y in visited if isinstance(y, URIRef)}
+            out[seed] = visited
+        return out
+
+
+def _find(node, match):
+    if match(node):
+        return node
+    if isinstance(node, dict):
+        children = node.values()
+    elif isinstance(node, (list, tuple)):
+        children = node
+    else:
+        return None
+    for child in children:
+        found = _find(child, match)
+        if found is not None:
+            return found
+    return None
+
+
+def _compile_star_path(query_text: str) -> StarPathPlan | None:
+    """
+    Parses a `?seed (...)* ?c` query once and returns its StarPathPlan,
+    or None when the path is not a star over plain / inverse IRIs.
+    """
+    algebra = prepareQuery(query_text % "<urn:x-seed>").algebra
+    bgp = _find(algebra, lambda n: isinstance(n, CompValue) and n.name == "BGP")
+    if bgp is None or len(bgp.triples) != 1:
+        return None
+    path = bgp.triples[0][1]
+    if not (isinstance(path, MulPath) and path.mod == ZeroOrMore):
+        return None
+
+    alts = path.path.args if isinstance(path.path, AlternativePath) else [path.path]
+    steps: list[tuple[URIRef, bool]] = []
+    for a in alts:
+        if isinstance(a, URIRef):
+            steps.append((a, False))
+        elif isinstance(a, InvPath) and isinstance(a.arg, URIRef):
+            steps.append((a.arg, True))
+        else:
+            return None
+
+    iri_only = _find(
+        algebra, lambda n: isinstance(n, CompValue) and n.name == "Builtin_isIRI"
+    ) is not None
+    return StarPathPlan(steps, iri_only)
+
+
+# query text -> compiled plan (None: not compilable, use rdflib's evaluator)
+_PLANS: dict[str, StarPathPlan | None] = {}
+
+
+def _reachable(
+    graph: Graph,
+    seeds: set[Node],
+    native: bool,
+    query_text: str = _QUERY_TEMPLATE,
+) -> dict[Node, set[Node]]:
     """
-    Computes closure(seed) for every seed in one SPARQL query.
+    Evaluates the closure query for `seeds` on `graph`: { seed -> reached nodes }.
+    """
+    if native:
+        if query_text not in _PLANS:
+            _PLANS[query_text] = _compile_star_path(query_text)
+        plan = _PLANS[query_text]
+        if plan is not None:
+            return plan.evaluate(graph, seeds)
+
+    reached: dict[Node, set[Node]] = {}
+    q = prepareQuery(query_text % _values_block_uris(seeds))
+    for row in graph.query(q):
+        reached.setdefault(row.get("seed"), set()).add(row.get("c"))
+    return reached
+
+
+def closure_cache_sparql_all(
+    ont: Graph,
+    seeds: set[URIRef],
+    closure_store: ClosureStore | None = None,
+    condensed: bool = True,
+    native: bool = True,
+) -> dict[URIRef, set[URIRef]]:
+    """
+    Computes closure(seed) for every seed of the SPARQL property-path query.
+    By default the query runs over the SCC condensation of the class graph
+    (tc_engine.scc); condensed=False queries `ont` directly.
+    By default the path is evaluated by a compiled StarPathPlan (parsed once
+    per process); native=False goes through rdflib's SPARQL engine.
+    With a closure_store, seeds already cached for this ontology fingerprint
+    are not queried again and the new closures are written back.
     Returns: { seed -> set(reachable) }
     """
     if not seeds:
         return {}
-    values = _values_block_uris(seeds)
-    q = prepareQuery(_QUERY_TEMPLATE % values)
+    if closure_store is not None:
+        cached = closure_store.load_closures(ont, "sparql", (s for s in seeds if isinstance(s, URIRef)))
+        missing = {s for s in seeds if s not in cached}
+        if missing:
+            fresh = closure_cache_sparql_all(ont, missing, condensed=condensed, native=native)
+            closure_store.save_closures(
+                ont, "sparql", {s: cc for s, cc in fresh.items() if isinstance(s, URIRef)}
+            )
+            cached.update(fresh)
+        return cached
 
     cache: dict[URIRef, set[URIRef]] = {s: {s} for s in seeds}
-    for row in ont.query(q):
-        seed = row.get("seed")
-        c = row.get("c")
-        if isinstance(seed, URIRef) and isinstance(c, URIRef):
-            cache.setdefault(seed, set()).add(c)
-    # Ensure every seed exists even if query returns nothing for it
-    for s in seeds:
-        cache.setdefault(s, {s})
+    uri_seeds = {s for s in seeds if isinstance(s, URIRef)}
+    if not uri_seeds:
+        return cache
+
+    if not condensed:
+        reached = _reachable(ont, uri_seeds, native)
+        for s in uri_seeds:
+            cache[s].update(c for c in reached.get(s, ()) if isinstance(c, URIRef))
+        return cache
+
+    # Same query over the SCC-condensed class graph: each equivalence clique
+    # is walked once, then reached representatives expand back to members.
+    cond = get_condensation(ont, iri_only=False)
+    seed_rep: dict[URIRef, Node] = {}
+    for s in uri_seeds:
+        k = cond.component(s)
+        seed_rep[s] = s if k is None else cond.representative(k)
+
+    reached = _reachable(cond.to_graph(), set(seed_rep.values()), native)
+    for s, rep in seed_rep.items():
+        for c in reached.get(rep, ()):
+            k = cond.component(c)
+            if k is None:
+                continue
+            cache[s].update(m for m in cond.members(k) if isinstance(m, URIRef))
 
     return cache
 
@@ -89,13 +208,16 @@ def closure_cache_sparql_all(ont: Graph, seeds: set[URIRef]) -> dict[URIRef, set
 def expand_target_classes_cached_sparql(
     shapes_graph: Graph,
     ontology_graph: Graph,
-    seed_target_classes: set[URIRef]
+    seed_target_classes: set[URIRef],
+    closure_store: ClosureStore | None = None,
+    compact_against: Graph | None = None,
+    stats: dict[str, int] | None = None,
 ) -> tuple[Graph, set[URIRef], dict[URIRef, set[URIRef]]]:
     """
     Uses SPARQL property paths to compute closures for all seed_target_classes in one query,
     then rewrites shapes_graph by adding sh:targetClass for closure members.
     """
-    closure_cache = closure_cache_sparql_all(ontology_graph, seed_target_classes)
+    closure_cache = closure_cache_sparql_all(ontology_graph, seed_target_classes, closure_store)
 
     expanded_global: set[URIRef] = set()
     for cc in closure_cache.values():
@@ -104,6 +226,8 @@ def expand_target_classes_cached_sparql(
     rewritten = rewrite_shapes_target_classes_from_cache(
         shapes_graph,
         closure_cache,
+        compact_against=compact_against,
+        stats=stats,
     )
     return rewritten, expanded_global, closure_cache
 
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import itertools
+import weakref
+from typing import Any, Callable, Hashable
+
+from rdflib import Graph
+from rdflib.store import TripleAddedEvent, TripleRemovedEvent
+
+
+class _AddCounter:
+    """
+    Counts the TripleAddedEvents a store dispatches (Memory, IntegerStore
+    and OverlayStore dispatch one per add, before inserting). A removal
+    always shrinks the graph, so an edit that keeps its size adds
+    something, and (size, revision) changes with every edit.
+    """
+
+    def __init__(self, store):
+        self.dispatcher = store.dispatcher
+        self.generation = next(_GENERATIONS)
+        self.count = 0
+        self.dispatcher.subscribe(TripleAddedEvent, self._on_add)
+        # once a map is set, events without a handler raise
+        self.dispatcher.get_map().setdefault(TripleRemovedEvent, [])
+
+    def _on_add(self, event) -> None:
+        self.count += 1
+
+    @property
+    def attached(self) -> bool:
+        # a DeltaLog that owned the map resets it when it closes
+        handlers = (self.dispatcher.get_map() or {}).get(TripleAddedEvent, ())
+        return any(h == self._on_add for h in handlers)
+
+
+_GENERATIONS = itertools.count()
+_COUNTERS: "weakref.WeakKeyDictionary[Any, _AddCounter]" = weakref.WeakKeyDictionary()
+
+
+def revision(ont: Graph) -> tuple:
+    """
+    (size, counter generation, adds) of `ont`, different after any edit
+    of its store; just the size for a store without a dispatcher. A view
+    (overlay_graph, canonical_view, union_graph) also carries the
+    revisions of the graphs it reads, and a canonical view its merges.
+    """
+    store = ont.store
+    if getattr(store, "dispatcher", None) is None:
+        rev: tuple = (len(ont), -1, 0)
+    else:
+        counter = _COUNTERS.get(store)
+        if counter is None or not counter.attached:
+            # a fresh generation: nothing filed under the old counter matches
+            counter = _COUNTERS[store] = _AddCounter(store)
+        rev = (len(ont), counter.generation, counter.count)
+    members = list(getattr(store, "graphs", ()))
+    for name in ("base", "verbatim"):
+        g = getattr(store, name, None)
+        if isinstance(g, Graph):
+            members.append(g)
+    if members:
+        rev += tuple(revision(g) for g in members)
+    if isinstance(getattr(store, "canon", None), dict):
+        rev += (len(store.canon),)
+    return rev
+
+
+class GraphCache:
+    """
+    Structures built from an ontology Graph, one per graph object (and
+    optional key). Graphs hash by identifier, and overlays, canonical views
+    and ontology modules share their base's, so entries are keyed by id()
+    and dropped when the graph is collected.
+
+    An entry is reused while the graph's revision() is the one it was built
+    at (no triple added or removed since) and until
+    invalidate_ontology_caches(graph). `on_drop` is called on the entries
+    drop() and invalidate_ontology_caches discard.
+    """
+
+    def __init__(self, on_drop: Callable[[Any], None] | None = None):
+        self.on_drop = on_drop
+        self._entries: dict[int, dict[Hashable, tuple[tuple, Any]]] = {}
+        _CACHES.append(self)
+
+    def get(self, ont: Graph, key: Hashable = None) -> Any:
+        """
+        The entry of `ont` under `key`, or None when there is none or it is stale.
+        """
+        hit = self._entries.get(id(ont), {}).get(key)
+        if hit is not None and hit[0] == revision(ont):
+            return hit[1]
+        return None
+
+    def has(self, ont: Graph, key: Hashable = None) -> bool:
+        return self.get(ont, key) is not None
+
+    def put(self, ont: Graph, value: Any, key: Hashable = None) -> None:
+        entries = self._entries.get(id(ont))
+        if entries is None:
+            entries = self._entries[id(ont)] = {}
+            weakref.finalize(ont, self._entries.pop, id(ont), None)
+        entries[key] = (revision(ont), value)
+
+    def drop(self, ont: Graph, key: Hashable = None) -> None:
+        hit = self._entries.get(id(ont), {}).pop(key, None)
+        if hit is not None and self.on_drop is not None:
+            self.on_drop(hit[1])
+
+    def forget(self, ont: Graph) -> None:
+        for key in list(self._entries.get(id(ont), ())):
+            self.drop(ont, key)
+
+
+_CACHES: list[GraphCache] = []
+
+
+def invalidate_ontology_caches(ont: Graph) -> None:
+    """
+    Drops every structure cached for `ont` (closure index, condensations,
+    class matrix, planner statistics, worker pool). Edits are noticed by
+    revision() anyway; this frees the stale structures (and shuts a
+    worker pool down) at once. IncrementalClosure.apply_delta calls it.
+    """
+    for cache in _CACHES:
+        cache.forget(ont)
@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+import time
+from typing import Iterable
+
+from rdflib import Graph, Namespace, URIRef
+from rdflib.util import guess_format
+from rdflib.namespace import OWL, RDFS
+from rdflib.term import Identifier
+
+from tc_engine.graph_cache import invalidate_ontology_caches
+
+SH = Namespace("http://www.w3.org/ns/shacl#")
+
+Triple = tuple[Identifier, Identifier, Identifier]
+
+
+def _edges(triple: Triple) -> list[tuple[URIRef, URIRef]]:
+    """
+    Closure edges induced by one ontology triple (same edges as class_closure).
+    """
+    s, p, o = triple
+    if not (isinstance(s, URIRef) and isinstance(o, URIRef)) or s == o:
+        return []
+    if p == OWL.equivalentClass or p == OWL.sameAs:
+        return [(s, o), (o, s)]
+    if p == RDFS.subClassOf:
+        return [(o, s)]  # superclass -> subclass
+    return []
+
+
+class IncrementalClosure:
+    """
+    Keeps per-seed class closures and the sh:targetClass rewrite of a shapes
+    graph up to date while the ontology changes.
+
+    Edges carry a support count (several triples can induce the same edge).
+    An added edge extends the closures that already contain its source;
+    a removed edge is handled DRed-style: over-delete everything reachable
+    from its target inside each affected closure, then re-derive what is
+    still reachable from the remaining members.
+
+    `shapes_graph` must not have been rewritten yet: its sh:targetClass
+    triples are taken as the explicit targets of each shape.
+
+    `ontology_graph` must only be edited through apply_delta: the support
+    counts would miss any other edit, and so would the other engines'
+    caches of the graph, which apply_delta invalidates.
+    """
+
+    def __init__(self, shapes_graph: Graph, ontology_graph: Graph):
+        self.shapes_graph = shapes_graph
+        self.ontology_graph = ontology_graph
+
+        self.succ: dict[URIRef, dict[URIRef, int]] = {}
+        self.pred: dict[URIRef, dict[URIRef, int]] = {}
+        for p in (RDFS.subClassOf, OWL.equivalentClass, OWL.sameAs):
+            for t in ontology_graph.triples((None, p, None)):
+                for x, y in _edges(t):
+                    self._inc(x, y)
+
+        # explicit targets per shape, and the classes emitted for them
+        self.shape_targets: dict[Identifier, set[URIRef]] = {}
+        for shape, _, cls in shapes_graph.triples((None, SH.targetClass, None)):
+            if isinstance(cls, URIRef):
+                self.shape_targets.setdefault(shape, set()).add(cls)
+        self.emitted: dict[Identifier, set[URIRef]] = {
+            shape: set(targets) for shape, targets in self.shape_targets.items()
+        }
+
+        self.closure_cache: dict[URIRef, set[URIRef]] = {}
+        self.holders: dict[URIRef, set[URIRef]] = {}
+        for targets in self.shape_targets.values():
+            for seed in targets:
+                if seed not in self.closure_cache:
+                    self._set_closure(seed, self._reach({seed}, {seed}))
+
+        self._rewrite(self.shape_targets.keys())
+
+    # ----------------------------
+    # Contract of expand_target_classes_cached
+    # ----------------------------
+    @property
+    def rewritten(self) -> Graph:
+        return self.shapes_graph
+
+    @property
+    def expanded_global(self) -> set[URIRef]:
+        return set(self.holders)
+
+    def result(self) -> tuple[Graph, set[URIRef], dict[URIRef, set[URIRef]]]:
+        return self.rewritten, self.expanded_global, self.closure_cache
+
+    # ----------------------------
+    # Deltas
+    # ----------------------------
+    def apply_delta(
+        self,
+        added: Iterable[Triple] = (),
+        removed: Iterable[Triple] = (),
+    ) -> dict[str, int]:
+        """
+        Applies the ontology triple delta to ontology_graph and updates the
+        cached closures and the rewritten shapes graph. Triples that are
+        already present (added) or absent (removed) are ignored. Whatever
+        the engines cached for ontology_graph is dropped if it changed.
+        """
+        stats = {
+            "edges_added": 0,
+            "edges_removed": 0,
+            "seeds_changed": 0,
+            "target_triples_added": 0,
+            "target_triples_removed": 0,
+        }
+        new_edges: list[tuple[URIRef, URIRef]] = []
+        gone_edges: list[tuple[URIRef, URIRef]] = []
+        edited = False
+
+        for t in removed:
+            if t not in self.ontology_graph:
+                continue
+            self.ontology_graph.remove(t)
+            edited = True
+            for x, y in _edges(t):
+                if self._dec(x, y):
+                    gone_edges.append((x, y))
+        for t in added:
+            if t in self.ontology_graph:
+                continue
+            self.ontology_graph.add(t)
+            edited = True
+            for x, y in _edges(t):
+                if self._inc(x, y):
+                    new_edges.append((x, y))
+        stats["edges_added"] = len(new_edges)
+        stats["edges_removed"] = len(gone_edges)
+        if edited:
+            invalidate_ontology_caches(self.ontology_graph)
+
+        changed: set[URIRef] = set()
+        if gone_edges:
+            gone_succ: dict[URIRef, set[URIRef]] = {}
+            starts: dict[URIRef, set[URIRef]] = {}
+            for x, y in gone_edges:
+                gone_succ.setdefault(x, set()).add(y)
+                for seed in self.holders.get(x, ()):
+                    starts.setdefault(seed, set()).add(y)
+            for seed, ys in starts.items():
+                if self._delete_from(seed, ys, gone_succ):
+                    changed.add(seed)
+        for x, y in new_edges:
+            for seed in list(self.holders.get(x, ())):
+                cc = self.closure_cache[seed]
+                if y not in cc:
+                    self._set_closure(seed, cc | self._reach({y}, cc | {y}))
+                    changed.add(seed)
+        stats["seeds_changed"] = len(changed)
+
+        shapes = [
+            shape for shape, targets in self.shape_targets.items()
+            if not changed.isdisjoint(targets)
+        ]
+        added_n, removed_n = self._rewrite(shapes)
+        stats["target_triples_added"] = added_n
+        stats["target_triples_removed"] = removed_n
+        return stats
+
+    # ----------------------------
+    # Internals
+    # ----------------------------
+    def _inc(self, x: URIRef, y: URIRef) -> bool:
+        out = self.succ.setdefault(x, {})
+        out[y] = out.get(y, 0) + 1
+        self.pred.setdefault(y, {})[x] = out[y]
+        return out[y] == 1
+
+    def _dec(self, x: URIRef, y: URIRef) -> bool:
+        out = self.succ.get(x)
+        if not out or y not in out:
+            return False
+        out[y] -= 1
+        if out[y] > 0:
+            self.pred[y][x] = out[y]
+            return False
+        del out[y]
+        del self.pred[y][x]
+        return True
+
+    def _reach(self, frontier: set[URIRef], seen: set[URIRef]) -> set[URIRef]:
+        """
+        Everything reachable from `frontier`, not walking into `seen` twice.
+        Returns the frontier plus the nodes newly reached.
+        """
+        out = set(frontier)
+        stack = list(frontier)
+        while stack:
+            x = stack.pop()
+            for y in self.succ.get(x, ()):
+                if y not in seen and y not in out:
+                    out.add(y)
+                    stack.append(y)
+        return out
+
+    def _set_closure(self, seed: URIRef, closure: set[URIRef]) -> None:
+        old = self.closure_cache.get(seed, set())
+        for c in closure - old:
+            self.holders.setdefault(c, set()).add(seed)
+        for c in old - closure:
+            hs = self.holders[c]
+            hs.discard(seed)
+            if not hs:
+                del self.holders[c]
+        self.closure_cache[seed] = closure
+
+    def _delete_from(
+        self,
+        seed: URIRef,
+        starts: set[URIRef],
+        gone_succ: dict[URIRef, set[URIRef]],
+    ) -> bool:
+        cc = self.closure_cache[seed]
+
+        # over-delete: everything in the closure reachable from a removed
+        # edge's target, walking the edges as they were before the delta
+        over = {y for y in starts if y in cc}
+        stack = list(over)
+        while stack:
+            x = stack.pop()
+            for nbrs in (self.succ.get(x, ()), gone_succ.get(x, ())):
+                for z in nbrs:
+                    if z in cc and z not in over:
+                        over.add(z)
+                        stack.append(z)
+        over.discard(seed)
+        if not over:
+            return False
+
+        # re-derive: members of `over` still reachable from the rest
+        alive = cc - over
+        frontier = {
+            d for d in over
+            if any(p in alive for p in self.pred.get(d, ()))
+        }
+        restored = self._reach(frontier, alive) & over if frontier else set()
+        if len(restored) == len(over):
+            return False
+        self._set_closure(seed, alive | restored)
+        return True
+
+    def _rewrite(self, shapes: Iterable[Identifier]) -> tuple[int, int]:
+        added = removed = 0
+        for shape in shapes:
+            want: set[URIRef] = set()
+            for t in self.shape_targets[shape]:
+                want |= self.closure_cache[t]
+            have = self.emitted[shape]
+            for c in want - have:
+                self.shapes_graph.add((shape, SH.targetClass, c))
+                added += 1
+            for c in have - want:
+                self.shapes_graph.remove((shape, SH.targetClass, c))
+                removed += 1
+            self.emitted[shape] = want
+        return added, removed
+
+
+def update_rewrite(
+    shapes_graph: Graph,
+    old_ontology: Graph,
+    new_ontology: Graph,
+) -> tuple[IncrementalClosure, dict[str, int]]:
+    """
+    Rewrites `shapes_graph` against `old_ontology`, then moves it to
+    `new_ontology` by applying their triple difference as one delta.
+    `old_ontology` ends up holding the new triples. Returns the
+    IncrementalClosure (keep it for the next delta) and apply_delta's stats.
+    """
+    inc = IncrementalClosure(shapes_graph, old_ontology)
+    stats = inc.apply_delta(
+        added=[t for t in new_ontology if t not in old_ontology],
+        removed=[t for t in old_ontology if t not in new_ontology],
+    )
+    return inc, stats
+
+
+# nightly ontology update: shapes.ttl old.owl new.owl [out.ttl]
+def main() -> None:
+    import sys
+
+    from tc_engine.engine_rdflib import expand_target_classes_cached
+
+    shapes_path, old_path, new_path = sys.argv[1:4]
+    out_path = sys.argv[4] if len(sys.argv) > 4 else None
+
+    def load(path: str) -> Graph:
+        g = Graph()
+        g.parse(path, format=guess_format(path))
+        return g
+
+    shapes_graph, old_ontology, new_ontology = load(shapes_path), load(old_path), load(new_path)
+    seeds: set[URIRef] = {
+        cls for _, _, cls in shapes_graph.triples((None, SH.targetClass, None))
+        if isinstance(cls, URIRef)
+    }
+    full, _, expected = expand_target_classes_cached(load(shapes_path), new_ontology, seeds)
+
+    t0 = time.perf_counter_ns()
+    inc, stats = update_rewrite(shapes_graph, old_ontology, new_ontology)
+    t1 = time.perf_counter_ns()
+    print(f"rewrite + delta: {(t1 - t0) / 1e6:.3f} ms  {stats}")
+    same = set(inc.rewritten.triples((None, SH.targetClass, None))) == set(full.triples((None, SH.targetClass, None)))
+    print(f"identical closures: {inc.closure_cache == expected}  identical targets: {same}")
+
+    if out_path is not None:
+        inc.rewritten.serialize(destination=out_path, format=guess_format(out_path) or "turtle")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+from __future__ import annotations
+
+import logging
+import math
+import os
+from typing import Callable
+
+from rdflib import Graph, Namespace, URIRef
+from rdflib.namespace import OWL, RDF, RDFS, SH
+
+from tc_engine import closure_index, engine_parallel, engine_sparse, scc
+from tc_engine.engine_parallel import expand_target_classes_cached_parallel
+from tc_engine.engine_rdflib import expand_target_classes_cached
+from tc_engine.engine_sparql import expand_target_classes_cached_sparql
+from tc_engine.engine_sparse import expand_target_classes_cached_sparse
+from tc_engine.graph_cache import GraphCache
+
+logger = logging.getLogger(__name__)
+
+
+class OntologyStats:
+    """
+    Size and shape of the class graph of an ontology (same edges as
+    engine_rdflib.class_closure), collected in one pass over the triples.
+    """
+
+    def __init__(self, classes: int, subclass_edges: int, equivalence_edges: int, parents: int):
+        self.classes = classes
+        self.subclass_edges = subclass_edges
+        self.equivalence_edges = equivalence_edges
+        self.parents = parents  # classes with at least one direct subclass
+
+    @classmethod
+    def collect(cls, ont: Graph) -> "OntologyStats":
+        nodes: set[URIRef] = set()
+        parents: set[URIRef] = set()
+        subclass_edges = equivalence_edges = 0
+        for p in (OWL.equivalentClass, OWL.sameAs):
+            for a, _, b in ont.triples((None, p, None)):
+                if isinstance(a, URIRef) and isinstance(b, URIRef):
+                    nodes.add(a)
+                    nodes.add(b)
+                    equivalence_edges += 1
+        for sub, _, sup in ont.triples((None, RDFS.subClassOf, None)):
+            if isinstance(sub, URIRef) and isinstance(sup, URIRef):
+                nodes.add(sub)
+                nodes.add(sup)
+                parents.add(sup)
+                subclass_edges += 1
+        return cls(len(nodes), subclass_edges, equivalence_edges, len(parents))
+
+    @property
+    def edges(self) -> int:
+        return self.subclass_edges + 2 * self.equivalence_edges
+
+    @property
+    def avg_fanout(self) -> float:
+        """
+        Direct subclasses per class that has any.
+        """
+        return self.subclass_edges / self.parents if self.parents else 0.0
+
+    @property
+    def equivalence_density(self) -> float:
+        """
+        Share of the class graph edges induced by equivalentClass/sameAs.
+        """
+        return 2 * self.equivalence_edges / self.edges if self.edges else 0.0
+
+    @property
+    def depth(self) -> float:
+        """
+        Expected hierarchy depth, assuming a balanced tree with avg_fanout.
+        """
+        if self.classes < 2:
+            return 1.0
+        return max(1.0, math.log(self.classes) / math.log(max(self.avg_fanout, 1.5)))
+
+    def as_dict(self) -> dict[str, float]:
+        return {
+            "classes": self.classes,
+            "edges": self.edges,
+            "avg_fanout": round(self.avg_fanout, 2),
+            "equivalence_density": round(self.equivalence_density, 3),
+        }
+
+
+_STATS = GraphCache()
+
+
+def get_ontology_stats(ont: Graph) -> OntologyStats:
+    """
+    Returns the OntologyStats of `ont`, collected once per graph object (GraphCache).
+    """
+    stats = _STATS.get(ont)
+    if stats is not None:
+        return stats
+    stats = OntologyStats.collect(ont)
+    _STATS.put(ont, stats)
+    return stats
+
+
+# ----------------------------
+# Cost model (ns): each engine's cost is a weighted sum of the features
+# below, coefficient by coefficient. An engine pays a one-off build of its
+# per-ontology structure ("build_*", dropped when it is already cached for
+# this graph), the cost of the seeds, and the shapes rewrite shared by all
+# engines. COEFFICIENTS holds the output of calibrate(), i.e. non-negative
+# least squares against the tc_engine_only_ns that merged_graph_no_tc
+# reports, cold and warm, on CALIBRATION_SIZES synthetic hierarchies.
+# Re-run `python -m tc_engine.planner` on the benchmark machine and paste
+# its output here when an engine or the hardware changes.
+# ----------------------------
+CALIBRATION_SIZES = (200, 1_000, 5_000, 20_000)
+CALIBRATION_SEEDS = (5, 50, 500)
+WARM_RUNS = 3
+
+COEFFICIENTS: dict[str, dict[str, float]] = {
+    # calibrate() on 1 CPU, Python 3.11, rdflib 7.6 (2026-10-17); median
+    # predicted/actual: rdflib 1.21, sparql 0.41, sparse 0.67, parallel 0.44.
+    # The rewrite dominates at these sizes, its spread comes from how far
+    # the real closure sizes stray from seeds * depth. With one CPU the pool
+    # ran a single worker, so re-fit on a multi-core host.
+    "rewrite": {"per_member": 16_400},
+    "rdflib": {"build_fixed": 0.0, "build_per_edge": 0.0, "build_per_word": 41.4, "per_seed": 0.0, "per_word": 6.49e-06},
+    "sparql": {"build_fixed": 0.0, "build_per_edge": 21.8, "per_condensed_edge": 1.14, "per_seed": 182},
+    "sparse": {"build_fixed": 0.0, "build_per_edge": 13.3, "fixed": 4_680, "per_level": 1_120, "per_edge": 0.0, "per_seed": 0.0},
+    "parallel": {
+        "build_fixed": 0.0, "build_per_cpu": 0.0, "build_per_edge": 0.0,
+        "fixed": 5_460, "per_level": 2_500, "per_edge": 0.0, "per_seed": 0.0, "per_member": 0.0,
+    },
+}
+
+
+def _features(name: str, st: OntologyStats, seeds: int, built: bool) -> dict[str, float]:
+    """
+    The quantities COEFFICIENTS[name] weighs, for `seeds` seeds on `st`.
+    """
+    # a closure holds about `depth` classes on average
+    members = seeds * st.depth
+    if name == "rewrite":
+        # one sh:targetClass triple per closure member
+        return {"per_member": members}
+    build = 0.0 if built else 1.0
+    if name == "rdflib":
+        # bitset closures: the DP and the decoding both touch n/64-word ints
+        words = st.classes * st.classes / 64
+        return {
+            "build_fixed": build, "build_per_edge": build * st.edges, "build_per_word": build * words,
+            "per_seed": seeds, "per_word": words,
+        }
+    if name == "sparql":
+        # the path is walked over the condensation, equivalence cliques collapsed
+        return {
+            "build_fixed": build, "build_per_edge": build * st.edges,
+            "per_condensed_edge": st.edges * (1 - st.equivalence_density / 2), "per_seed": seeds,
+        }
+    if name == "sparse":
+        # one sparse product per BFS level
+        return {
+            "build_fixed": build, "build_per_edge": build * st.edges,
+            "fixed": 1.0, "per_level": st.depth, "per_edge": st.edges, "per_seed": seeds,
+        }
+    if name == "parallel":
+        # the sparse BFS split over the CPUs, plus starting the pool and
+        # shipping the closures back
+        cpus = os.cpu_count() or 1
+        return {
+            "build_fixed": build, "build_per_cpu": build * cpus, "build_per_edge": build * st.edges,
+            "fixed": 1.0, "per_level": st.depth / cpus, "per_edge": st.edges / cpus, "per_seed": seeds / cpus,
+            "per_member": members,
+        }
+    raise ValueError(f"No cost model for {name!r}")
+
+
+def predict(name: str, st: OntologyStats, seeds: int, built: bool) -> float:
+    """
+    Predicted tc_engine_only_ns of engine `name`, shapes rewrite included.
+    """
+    total = 0.0
+    for part in (name, "rewrite"):
+        coefficients = COEFFICIENTS[part]
+        total += sum(coefficients[k] * v for k, v in _features(part, st, seeds, built).items())
+    return total
+
+
+ENGINES: dict[str, tuple[Callable, Callable[[Graph], bool]]] = {
+    # name: (expand function, structure already built?)
+    "rdflib": (expand_target_classes_cached, closure_index.has_closure_index),
+    "sparql": (expand_target_classes_cached_sparql, lambda ont: scc.has_condensation(ont, iri_only=False)),
+    "sparse": (expand_target_classes_cached_sparse, engine_sparse.has_class_matrix),
+    "parallel": (expand_target_classes_cached_parallel, engine_parallel.has_parallel_closure),
+}
+
+# The engines "auto" picks from. They close over the same IRI-only class
+# graph (engine_rdflib.class_closure), so the choice never changes the
+# rewritten shapes. The SPARQL engine also walks blank-node class
+# expressions and can reach more classes; it runs only when named.
+AUTO_ENGINES = ("rdflib", "sparse", "parallel")
+
+
+class Plan:
+    """
+    The engine picked for one expansion and what every engine was predicted to cost.
+    """
+
+    def __init__(self, name: str, costs: dict[str, float], stats: OntologyStats, seeds: int):
+        self.name = name
+        self.engine = ENGINES[name][0]
+        self.costs = costs
+        self.stats = stats
+        self.seeds = seeds
+
+    @property
+    def predicted_ns(self) -> int:
+        return int(self.costs[self.name])
+
+
+def choose_engine(
+    ontology_graph: Graph,
+    seed_target_classes: set[URIRef],
+    override: str | None = None,
+) -> Plan:
+    """
+    Picks the AUTO_ENGINES engine with the lowest predicted cost for these seeds.
+    override: an ENGINES name to use regardless of the costs (still predicted and logged).
+    Closures served by a ClosureStore are not modelled.
+    """
+    if override is not None and override not in ENGINES:
+        raise ValueError(f"Unknown TC engine {override!r}, expected one of {sorted(ENGINES)}")
+
+    st = get_ontology_stats(ontology_graph)
+    seeds = sum(1 for s in seed_target_classes if isinstance(s, URIRef))
+    costs = {
+        name: predict(name, st, seeds, built(ontology_graph))
+        for name, (_, built) in ENGINES.items()
+    }
+    name = override or min(AUTO_ENGINES, key=costs.get)
+
+    logger.info(
+        "TC engine %s%s: predicted %.3f ms (%s; seeds=%d; %s)",
+        name,
+        " (override)" if override else "",
+        costs[name] / 1e6,
+        ", ".join(f"{n}={c / 1e6:.3f} ms" for n, c in costs.items()),
+        seeds,
+        st.as_dict(),
+    )
+    return Plan(name, costs, st, seeds)
+
+
+# ----------------------------
+# Calibration
+# ----------------------------
+def synthetic_hierarchy(classes: int, fanout: int = 4, equivalence_share: float = 0.05, seed: int = 0) -> Graph:
+    """
+    A class tree of `classes` IRIs with about `fanout` subclasses per
+    parent, `equivalence_share` of them owl:equivalentClass to an alias
+    IRI outside the tree (as DBpedia's links to external vocabularies).
+    """
+    import random
+
+    rng = random.Random(seed)
+    ex = Namespace("http://example.org/calibration#")
+    g = Graph()
+    for i in range(1, classes):
+        g.add((ex[f"C{i}"], RDFS.subClassOf, ex[f"C{(i - 1) // fanout}"]))
+    for i in rng.sample(range(classes), int(classes * equivalence_share)):
+        g.add((ex[f"C{i}"], OWL.equivalentClass, ex[f"Alias{i}"]))
+    return g
+
+
+def calibrate(
+    engines: tuple[str, ...] = tuple(ENGINES),
+    sizes: tuple[int, ...] = CALIBRATION_SIZES,
+    seed_counts: tuple[int, ...] = CALIBRATION_SEEDS,
+) -> tuple[dict[str, dict[str, float]], list[tuple[str, int, int, bool, int]]]:
+    """
+    Fits COEFFICIENTS from measurements. Every engine runs through
+    merged_graph_no_tc on a one-triple data graph, once cold (after
+    invalidate_ontology_caches) and WARM_RUNS times warm, and its
+    tc_engine_only_ns is recorded (the fastest warm run). The shapes rewrite is timed on its own first; the engines
+    are fitted on what remains.
+
+    Returns the coefficients and the (engine, classes, seeds, built, ns) samples.
+    """
+    import random
+    import time
+
+    import numpy as np
+    from scipy.optimize import nnls
+
+    from reSHACL.re_shacl_no_tc import merged_graph_no_tc
+    from tc_engine.engine_rdflib import rewrite_shapes_target_classes_from_cache
+    from tc_engine.graph_cache import invalidate_ontology_caches
+
+    ex = Namespace("http://example.org/calibration#")
+
+    def shapes_for(seeds: list[URIRef]) -> Graph:
+        sg = Graph()
+        for i, c in enumerate(seeds):
+            shape = ex[f"S{i}"]
+            sg.add((shape, RDF.type, SH.NodeShape))
+            sg.add((shape, SH.targetClass, c))
+        return sg
+
+    rng = random.Random(0)
+    samples: list[tuple[str, int, int, bool, int]] = []
+    rewrite_rows: list[dict[str, float]] = []
+    rewrite_ns: list[float] = []
+    engine_rows: dict[str, tuple[list[dict[str, float]], list[float]]] = {name: ([], []) for name in engines}
+    for classes in sizes:
+        ont = synthetic_hierarchy(classes)
+        st = OntologyStats.collect(ont)
+        for count in seed_counts:
+            # uniform seeds: their closures average `depth` classes, as predict assumes
+            seeds = [ex[f"C{i}"] for i in rng.sample(range(classes), min(count, classes))]
+            closures, _ = closure_index.ClosureIndex.build(ont).expand(set(seeds))
+            t0 = time.perf_counter_ns()
+            rewrite_shapes_target_classes_from_cache(shapes_for(seeds), closures)
+            rewrite = time.perf_counter_ns() - t0
+            # the rewrite is fitted on the real closure sizes, the engines
+            # on what is left of tc_engine_only_ns once it is taken out
+            rewrite_rows.append({"per_member": sum(len(c) for c in closures.values())})
+            rewrite_ns.append(rewrite)
+            for name in engines:
+                invalidate_ontology_caches(ont)
+                for built in (False, True):
+                    # one cold run; the best of WARM_RUNS warm ones, against GC pauses
+                    runs = []
+                    for _ in range(WARM_RUNS if built else 1):
+                        data = Graph()
+                        data.add((ex.x, RDF.type, ex.C0))
+                        _, _, _, timing = merged_graph_no_tc(data, ont, shacl_graph=shapes_for(seeds), tc_engine=name)
+                        runs.append(timing["tc_engine_only_ns"])
+                    total = min(runs)
+                    samples.append((name, classes, len(seeds), built, total))
+                    engine_rows[name][0].append(_features(name, st, len(seeds), built))
+                    engine_rows[name][1].append(max(total - rewrite, 0))
+        invalidate_ontology_caches(ont)
+
+    def fit(rows: list[dict[str, float]], ns: list[float]) -> dict[str, float]:
+        keys = list(rows[0])
+        scale = np.array([max(max(abs(r[k]) for r in rows), 1e-9) for k in keys])
+        a = np.array([[r[k] for k in keys] for r in rows]) / scale
+        # relative error, so the big ontologies do not drown the small ones
+        weights = 1 / np.maximum(np.array(ns, dtype=float), 1e5)
+        x, _ = nnls(a * weights[:, None], np.array(ns, dtype=float) * weights)
+        return {k: float(f"{v:.3g}") for k, v in zip(keys, x / scale)}
+
+    fitted = {"rewrite": fit(rewrite_rows, rewrite_ns)}
+    for name, (rows, ns) in engine_rows.items():
+        fitted[name] = fit(rows, ns)
+    return fitted, samples
+
+
+def main() -> None:
+    import pprint
+
+    fitted, samples = calibrate()
+    print("COEFFICIENTS = ", end="")
+    pprint.pprint(fitted, sort_dicts=False, width=120)
+
+    stats = {classes: OntologyStats.collect(synthetic_hierarchy(classes)) for classes in CALIBRATION_SIZES}
+    COEFFICIENTS.update(fitted)
+    ratios: dict[str, list[float]] = {}
+    for name, classes, seeds, built, ns in samples:
+        ratios.setdefault(name, []).append(predict(name, stats[classes], seeds, built) / ns)
+    for name, r in ratios.items():
+        print(f"{name}: predicted/actual tc_engine_only_ns median {sorted(r)[len(r) // 2]:.2f}, range {min(r):.2f}-{max(r):.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+from rdflib import Graph, URIRef
+from rdflib.namespace import OWL, RDFS
+from rdflib.term import Node
+
+from tc_engine.graph_cache import GraphCache
+
+
+def strongly_connected_components(succ: list[list[int]]) -> tuple[list[int], list[list[int]]]:
+    """
+    Iterative Tarjan over an adjacency list of integer nodes.
+
+    Returns (comp_of, comps): comp_of[v] is the component id of v and comps[k]
+    lists the members of component k. Components are numbered in the order
+    Tarjan emits them, i.e. every edge between components goes from a higher
+    to a lower id (reverse topological order: sinks first).
+    """
+    n = len(succ)
+    index = [-1] * n
+    low = [0] * n
+    on_stack = [False] * n
+    stack: list[int] = []
+    comp_of = [-1] * n
+    comps: list[list[int]] = []
+    counter = 0
+
+    for root in range(n):
+        if index[root] != -1:
+            continue
+        # (node, position in succ[node])
+        work: list[tuple[int, int]] = [(root, 0)]
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+
+        while work:
+            v, i = work[-1]
+            nbrs = succ[v]
+            if i < len(nbrs):
+                work[-1] = (v, i + 1)
+                w = nbrs[i]
+                if index[w] == -1:
+                    index[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack[w] = True
+                    work.append((w, 0))
+                elif on_stack[w] and index[w] < low[v]:
+                    low[v] = index[w]
+                continue
+
+            work.pop()
+            if work:
+                u = work[-1][0]
+                if low[v] < low[u]:
+                    low[u] = low[v]
+            if low[v] == index[v]:
+                k = len(comps)
+                members: list[int] = []
+                while True:
+                    w = stack.pop()
+                    on_stack[w] = False
+                    comp_of[w] = k
+                    members.append(w)
+                    if w == v:
+                        break
+                comps.append(members)
+
+    return comp_of, comps
+
+
+class Condensation:
+    """
+    Class graph of an ontology with every strongly connected component
+    (equivalentClass/sameAs cliques, subClassOf cycles) collapsed to one node.
+
+    Edges follow engine_rdflib.class_closure: eq/sameAs both ways and
+    rdfs:subClassOf downwards (superclass -> subclass). With iri_only=True
+    only URIRef nodes are kept, as in class_closure; otherwise every term is a
+    node, as in the SPARQL property path.
+    """
+
+    def __init__(
+        self,
+        nodes: list[Node],
+        comp_of: list[int],
+        comps: list[list[int]],
+        dag: list[list[int]],
+    ):
+        self.nodes = nodes
+        self.ids: dict[Node, int] = {u: i for i, u in enumerate(nodes)}
+        self.comp_of = comp_of
+        self.comps = comps
+        self.dag = dag
+        self._graph: Graph | None = None
+
+    @classmethod
+    def build(cls, ont: Graph, iri_only: bool = True) -> "Condensation":
+        nodes: list[Node] = []
+        ids: dict[Node, int] = {}
+        succ: list[list[int]] = []
+
+        def intern(u: Node) -> int:
+            i = ids.get(u)
+            if i is None:
+                i = len(nodes)
+                ids[u] = i
+                nodes.append(u)
+                succ.append([])
+            return i
+
+        for p in (OWL.equivalentClass, OWL.sameAs):
+            for a, _, b in ont.triples((None, p, None)):
+                if iri_only and not (isinstance(a, URIRef) and isinstance(b, URIRef)):
+                    continue
+                ia, ib = intern(a), intern(b)
+                succ[ia].append(ib)
+                succ[ib].append(ia)
+        for sub, _, sup in ont.triples((None, RDFS.subClassOf, None)):
+            if iri_only and not (isinstance(sub, URIRef) and isinstance(sup, URIRef)):
+                continue
+            succ[intern(sup)].append(intern(sub))
+
+        comp_of, comps = strongly_connected_components(succ)
+
+        dag: list[list[int]] = [[] for _ in comps]
+        for v, nbrs in enumerate(succ):
+            cv = comp_of[v]
+            for w in nbrs:
+                cw = comp_of[w]
+                if cw != cv:
+                    dag[cv].append(cw)
+        dag = [sorted(set(out)) for out in dag]
+
+        return cls(nodes, comp_of, comps, dag)
+
+    def component(self, u: Node) -> int | None:
+        i = self.ids.get(u)
+        return None if i is None else self.comp_of[i]
+
+    def members(self, k: int) -> list[Node]:
+        return [self.nodes[i] for i in self.comps[k]]
+
+    def representative(self, k: int) -> Node:
+        """
+        A URIRef member of component k when there is one.
+        """
+        for i in self.comps[k]:
+            if isinstance(self.nodes[i], URIRef):
+                return self.nodes[i]
+        return self.nodes[self.comps[k][0]]
+
+    def closure_bits(self) -> list[int]:
+        """
+        For every node v, the bitset (over node ids) of everything reachable
+        from v, including v. Computed once per component over the DAG.
+        """
+        comp_bits: list[int] = [0] * len(self.comps)
+        # Tarjan numbering: successors of a component always have lower ids
+        for k, members in enumerate(self.comps):
+            bits = 0
+            for i in members:
+                bits |= 1 << i
+            for c in self.dag[k]:
+                bits |= comp_bits[c]
+            comp_bits[k] = bits
+        return [comp_bits[k] for k in self.comp_of]
+
+    def to_graph(self) -> Graph:
+        """
+        The condensed DAG as an rdfs:subClassOf graph over component representatives.
+        """
+        if self._graph is not None:
+            return self._graph
+        g = Graph()
+        for k, out in enumerate(self.dag):
+            sup = self.representative(k)
+            for c in out:
+                g.add((self.representative(c), RDFS.subClassOf, sup))
+        self._graph = g
+        return g
+
+
+_CONDENSATIONS = GraphCache()  # keyed by iri_only
+
+
+def has_condensation(ont: Graph, iri_only: bool = True) -> bool:
+    """
+    Whether the Condensation of `ont` (for `iri_only`) is built and still valid.
+    """
+    return _CONDENSATIONS.has(ont, iri_only)
+
+
+def get_condensation(ont: Graph, iri_only: bool = True) -> Condensation:
+    """
+    Returns the Condensation of `ont`, built once per graph object (GraphCache).
+    """
+    cond = _CONDENSATIONS.get(ont, iri_only)
+    if cond is not None:
+        return cond
+    cond = Condensation.build(ont, iri_only=iri_only)
+    _CONDENSATIONS.put(ont, cond, iri_only)
+    return cond
@@ -0,0 +1,84 @@
+import random
+
+import pytest
+from rdflib import Graph, Namespace
+from rdflib.namespace import OWL, RDF, RDFS
+
+from tc_engine.engine_rdflib import class_closure
+from tc_engine.incremental import IncrementalClosure, update_rewrite
+
+EX = Namespace("http://example.org/")
+SH = Namespace("http://www.w3.org/ns/shacl#")
+PREDICATES = (RDFS.subClassOf, RDFS.subClassOf, OWL.equivalentClass, OWL.sameAs)
+
+
+def random_triple(rng, classes):
+    return (EX[f"C{rng.randrange(classes)}"], rng.choice(PREDICATES), EX[f"C{rng.randrange(classes)}"])
+
+
+def expected_targets(shapes, ont, seeds):
+    return {shape: set().union(*(class_closure(ont, s) for s in targets)) for shape, targets in seeds.items()}
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_deltas_match_a_full_recompute(seed):
+    rng = random.Random(seed)
+    classes = 12  # small, so the random edges close cycles
+    ont = Graph()
+    for _ in range(15):
+        ont.add(random_triple(rng, classes))
+
+    shapes = Graph()
+    seeds = {}
+    for i in range(3):
+        shape = EX[f"S{i}"]
+        shapes.add((shape, RDF.type, SH.NodeShape))
+        seeds[shape] = {EX[f"C{rng.randrange(classes)}"] for _ in range(2)}
+        for c in seeds[shape]:
+            shapes.add((shape, SH.targetClass, c))
+
+    inc = IncrementalClosure(shapes, ont)
+    for _ in range(25):
+        present = list(ont)
+        removed = rng.sample(present, min(len(present), rng.randrange(4)))
+        added = [random_triple(rng, classes) for _ in range(rng.randrange(4))]
+        inc.apply_delta(added=added, removed=removed)
+
+        for s, closure in inc.closure_cache.items():
+            assert closure == class_closure(ont, s)
+        for shape, want in expected_targets(shapes, ont, seeds).items():
+            assert set(shapes.objects(shape, SH.targetClass)) == want
+        _, expanded, _ = inc.result()
+        assert expanded == set().union(*(class_closure(ont, s) for t in seeds.values() for s in t))
+
+
+def test_removing_one_of_two_supports_keeps_the_edge():
+    ont = Graph()
+    ont.add((EX.A, RDFS.subClassOf, EX.T))
+    ont.add((EX.A, OWL.equivalentClass, EX.T))
+    shapes = Graph()
+    shapes.add((EX.S, SH.targetClass, EX.T))
+    inc = IncrementalClosure(shapes, ont)
+
+    stats = inc.apply_delta(removed=[(EX.A, RDFS.subClassOf, EX.T)])
+    assert stats["edges_removed"] == 0
+    assert inc.closure_cache[EX.T] == {EX.T, EX.A}
+
+    stats = inc.apply_delta(removed=[(EX.A, OWL.equivalentClass, EX.T)])
+    assert stats["target_triples_removed"] == 1
+    assert inc.closure_cache[EX.T] == {EX.T}
+    assert set(shapes.objects(EX.S, SH.targetClass)) == {EX.T}
+
+
+def test_update_rewrite_moves_the_shapes_to_the_new_ontology():
+    old = Graph()
+    old.add((EX.A, RDFS.subClassOf, EX.T))
+    new = Graph()
+    new.add((EX.A, RDFS.subClassOf, EX.U))
+    new.add((EX.C, OWL.equivalentClass, EX.T))
+    shapes = Graph()
+    shapes.add((EX.S, SH.targetClass, EX.T))
+
+    inc, _ = update_rewrite(shapes, old, new)
+    assert set(old) == set(new)
+    assert set(shapes.objects(EX.S, SH.targetClass)) == class_closure(new, EX.T) == {EX.T, EX.C}
@@ -0,0 +1,114 @@
+import random
+
+from rdflib import Graph, Namespace, URIRef
+
+from reSHACL.overlay import overlay_graph
+
+EX = Namespace("http://example.org/")
+OTHER = URIRef("http://other.example.org/")
+
+
+def base_graph() -> Graph:
+    g = Graph(bind_namespaces="none")
+    g.bind("ex", EX)
+    g.add((EX.a, EX.p, EX.b))
+    g.add((EX.a, EX.p, EX.c))
+    g.add((EX.b, EX.q, EX.c))
+    return g
+
+
+def test_remove_a_base_triple_then_add_it_back():
+    base = base_graph()
+    g = overlay_graph(base)
+    t = (EX.a, EX.p, EX.b)
+
+    g.remove(t)
+    assert t not in g
+    assert len(g) == 2
+    assert set(g.objects(EX.a, EX.p)) == {EX.c}
+
+    g.add(t)
+    assert t in g
+    assert len(g) == 3
+    assert not g.store.removed
+    assert len(g.store.added) == 0  # back from the base, not copied
+
+    # the base is never written to
+    assert len(base) == 3 and t in base
+
+
+def test_remove_a_triple_the_overlay_added():
+    base = base_graph()
+    g = overlay_graph(base)
+    t = (EX.c, EX.p, EX.a)
+
+    g.add(t)
+    assert t in g and t not in base
+    assert len(g) == 4
+
+    g.remove(t)
+    assert t not in g
+    assert len(g) == 3
+    assert not g.store.removed
+    assert len(g.store.added) == 0
+
+
+def test_adding_a_base_triple_and_removing_twice_are_no_ops():
+    g = overlay_graph(base_graph())
+    t = (EX.a, EX.p, EX.b)
+
+    g.add(t)
+    assert len(g) == 3 and len(g.store.added) == 0
+    g.remove(t)
+    g.remove(t)
+    assert len(g) == 2
+    g.remove((EX.a, None, None))
+    assert len(g) == 1
+    assert set(g) == {(EX.b, EX.q, EX.c)}
+
+
+def test_random_edits_match_a_copy():
+    rng = random.Random(0)
+    nodes = [EX[f"n{i}"] for i in range(5)]
+    base = Graph()
+    for _ in range(20):
+        base.add((rng.choice(nodes), EX.p, rng.choice(nodes)))
+    before = set(base)
+    g = overlay_graph(base)
+    copy = Graph()
+    for t in base:
+        copy.add(t)
+
+    for _ in range(300):
+        t = (rng.choice(nodes), EX.p, rng.choice(nodes))
+        if rng.random() < 0.5:
+            g.add(t)
+            copy.add(t)
+        else:
+            pattern = (t[0], None, None) if rng.random() < 0.1 else t
+            g.remove(pattern)
+            copy.remove(pattern)
+        assert len(g) == len(copy)
+    assert set(g) == set(copy)
+    for n in nodes:
+        assert set(g.triples((n, None, None))) == set(copy.triples((n, None, None)))
+        assert set(g.triples((None, None, n))) == set(copy.triples((None, None, n)))
+    assert set(base) == before
+
+
+def test_prefixes_fall_through_to_the_base():
+    base = base_graph()
+    g = overlay_graph(base)
+    assert g.store.namespace("ex") == URIRef(str(EX))
+    assert g.store.prefix(URIRef(str(EX))) == "ex"
+    assert g.qname(EX.a) == "ex:a"
+
+    g.bind("other", OTHER)
+    assert dict(g.namespaces())["other"] == OTHER
+    assert dict(g.namespaces())["ex"] == URIRef(str(EX))
+    assert base.store.namespace("other") is None
+
+    # a local binding of a base prefix hides the base one
+    g.bind("ex", URIRef("http://example.org/v2/"), override=True, replace=True)
+    assert dict(g.namespaces())["ex"] == URIRef("http://example.org/v2/")
+    assert base.store.namespace("ex") == URIRef(str(EX))
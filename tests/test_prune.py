@@ -0,0 +1,110 @@
+import pytest
+from pyshacl import validate
+from rdflib import Graph
+from rdflib.compare import isomorphic
+
+from reSHACL.prune import prune_for_validation
+
+PREFIXES = """
+@prefix ex: <http://example.org/> .
+@prefix rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#> .
+@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+@prefix sh: <http://www.w3.org/ns/shacl#> .
+@prefix xsd: <http://www.w3.org/2001/XMLSchema#> .
+"""
+
+DATA = PREFIXES + """
+ex:Student rdfs:subClassOf ex:Person .
+ex:Person rdfs:subClassOf ex:Agent .
+ex:Robot rdfs:subClassOf ex:Machine .
+
+ex:a a ex:Student ; ex:knows ex:b ; ex:alias "x" ; ex:friend _:x .
+ex:b ex:name "B" ; ex:parent ex:c ; ex:knows ex:a .
+ex:c a ex:Robot ; ex:name 5 ; ex:parent ex:e .
+ex:d a ex:Person ; ex:knows ex:a .
+ex:e ex:name "E" .
+_:x ex:name "anonymous" ; ex:note [ ex:text "nested" ] .
+"""
+# triples no shape reaches, for the pruning to drop
+NOISE = "".join(f"ex:n{i} ex:unrelated ex:m{i} .\n" for i in range(50))
+
+SHAPES = {
+    "sequence": """
+        ex:S a sh:NodeShape ; sh:targetClass ex:Person ;
+            sh:property [ sh:path ( ex:knows ex:parent ) ; sh:class ex:Person ] .
+    """,
+    "inverse": """
+        ex:S a sh:NodeShape ; sh:targetClass ex:Person ;
+            sh:property [ sh:path [ sh:inversePath ex:knows ] ; sh:minCount 2 ] .
+    """,
+    "alternative": """
+        ex:S a sh:NodeShape ; sh:targetClass ex:Student ;
+            sh:property [ sh:path [ sh:alternativePath ( ex:knows ex:friend ) ] ; sh:nodeKind sh:IRI ] .
+    """,
+    "zeroOrOne": """
+        ex:S a sh:NodeShape ; sh:targetNode ex:a ;
+            sh:property [ sh:path [ sh:zeroOrOnePath ex:knows ] ; sh:class ex:Person ] .
+    """,
+    "zeroOrMore": """
+        ex:S a sh:NodeShape ; sh:targetClass ex:Student ;
+            sh:property [ sh:path ( ex:knows [ sh:zeroOrMorePath ex:parent ] ) ; sh:datatype xsd:string ] .
+    """,
+    "oneOrMore": """
+        ex:S a sh:NodeShape ; sh:targetSubjectsOf ex:knows ;
+            sh:property [ sh:path [ sh:oneOrMorePath ex:parent ] ; sh:maxCount 0 ] .
+    """,
+    "node nesting": """
+        ex:S a sh:NodeShape ; sh:targetClass ex:Agent ;
+            sh:property [ sh:path ex:knows ; sh:node ex:Inner ] .
+        ex:Inner a sh:NodeShape ; sh:property [ sh:path ex:parent ; sh:node ex:Inner2 ] .
+        ex:Inner2 a sh:NodeShape ; sh:property [ sh:path ex:name ; sh:datatype xsd:string ] .
+    """,
+    "class through subClassOf": """
+        ex:S a sh:NodeShape ; sh:targetObjectsOf ex:parent , ex:knows ; sh:class ex:Agent .
+    """,
+    "closed": """
+        ex:S a sh:NodeShape ; sh:targetClass ex:Person ;
+            sh:closed true ; sh:ignoredProperties ( rdf:type ) ;
+            sh:property [ sh:path ex:knows ] .
+    """,
+}
+
+
+def report(data: Graph, shapes: Graph):
+    conforms, results, text = validate(data, shacl_graph=shapes)
+    return conforms, results, text
+
+
+@pytest.mark.parametrize("case", sorted(SHAPES))
+def test_pruned_graph_gives_the_same_report(case):
+    data = Graph().parse(data=DATA + NOISE, format="turtle")
+    shapes = Graph().parse(data=PREFIXES + SHAPES[case], format="turtle")
+
+    stats = {}
+    pruned = prune_for_validation(data, shapes, stats=stats)
+    assert stats["fallback"] is None
+    assert len(pruned) < len(data)
+
+    full_conforms, full_results, full_text = report(data, shapes)
+    conforms, results, text = report(pruned, shapes)
+    assert not full_conforms, "each case should report a violation"
+    assert conforms == full_conforms
+    assert isomorphic(results, full_results)
+    assert text == full_text
+
+
+@pytest.mark.parametrize("shapes_ttl, inference, reason", [
+    ("""ex:S a sh:NodeShape ; sh:targetNode ex:a ;
+            sh:sparql [ sh:select "SELECT $this WHERE { }" ] .""", "none", "uses sh:sparql"),
+    ("""ex:S a sh:NodeShape ; sh:targetClass ex:Person ; sh:property [ sh:path ex:knows ] .""", "rdfs", "inference=rdfs"),
+    ("""ex:S a sh:NodeShape ; sh:targetClass ex:Person ;
+            sh:property [ sh:path [ ex:unknownPath ex:knows ] ] .""", "none", "sh:path"),
+])
+def test_unbounded_shapes_validate_the_whole_graph(shapes_ttl, inference, reason):
+    data = Graph().parse(data=DATA + NOISE, format="turtle")
+    shapes = Graph().parse(data=PREFIXES + shapes_ttl, format="turtle")
+
+    stats = {}
+    assert prune_for_validation(data, shapes, inference=inference, stats=stats) is data
+    assert stats["fallback"].startswith(reason)
+    assert stats["pruned_triples"] == stats["graph_triples"] == len(data)
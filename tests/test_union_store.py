@@ -0,0 +1,70 @@
+import itertools
+import random
+
+import pytest
+from rdflib import BNode, Graph, Literal, Namespace
+from rdflib.graph import ModificationException
+
+from reSHACL.union_store import union_graph
+
+EX = Namespace("http://example.org/")
+
+
+def overlapping(seed: int, count: int = 3):
+    """`count` random graphs sharing terms, with triples in common."""
+    rng = random.Random(seed)
+    nodes = [EX[f"n{i}"] for i in range(6)] + [BNode("b0"), Literal("v")]
+    shared = [(rng.choice(nodes[:7]), rng.choice((EX.p, EX.q)), rng.choice(nodes)) for _ in range(10)]
+    graphs = []
+    for k in range(count):
+        g = Graph()
+        for t in rng.sample(shared, 6):
+            g.add(t)
+        for _ in range(8):
+            g.add((rng.choice(nodes[:7]), rng.choice((EX.p, EX.q, EX[f"only{k}"])), rng.choice(nodes)))
+        graphs.append(g)
+    return graphs
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_union_matches_the_materialised_union(seed):
+    graphs = overlapping(seed)
+    union = union_graph(*graphs)
+    expected = Graph()
+    for g in graphs:
+        expected += g
+
+    assert len(union) == len(expected)
+    # each triple once, however many graphs share it
+    assert sorted(union) == sorted(expected)
+
+    terms = [set(expected.subjects()), set(expected.predicates()), set(expected.objects())]
+    terms[0].add(EX.absent)
+    terms[1].add(EX.absent)
+    terms[2].add(EX.absent)
+    for s, p, o in itertools.product(*(sorted(ts, key=lambda t: t.n3()) + [None] for ts in terms)):
+        got = list(union.triples((s, p, o)))
+        assert len(got) == len(set(got)), (s, p, o)
+        assert set(got) == set(expected.triples((s, p, o))), (s, p, o)
+
+
+def test_terms_only_in_a_later_graph_are_found():
+    a, b = Graph(), Graph()
+    a.add((EX.x, EX.p, EX.y))
+    b.add((EX.y, EX.only, EX.z))
+    b.add((EX.x, EX.p, EX.y))  # shadowed by a
+    union = union_graph(a, b)
+
+    assert len(union) == 2
+    assert list(union.triples((None, EX.only, None))) == [(EX.y, EX.only, EX.z)]
+    assert list(union.triples((EX.z, None, None))) == []
+    assert list(union.triples((None, None, EX.z))) == [(EX.y, EX.only, EX.z)]
+    assert list(union.triples((EX.x, EX.p, EX.y))) == [(EX.x, EX.p, EX.y)]
+
+
+def test_union_is_read_only():
+    union = union_graph(Graph(), Graph())
+    with pytest.raises(ModificationException):
+        union.add((EX.x, EX.p, EX.y))
+    with pytest.raises(ModificationException):
+        union.remove((EX.x, None, None))